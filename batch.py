@@ -0,0 +1,74 @@
+# Renders seeded variants of a command into png files using a pool of worker processes
+
+import argparse
+import multiprocessing
+import os
+import gui
+from parser import GagParser
+
+# Every worker process parses the definitions once and keeps them for all variants it renders
+worker_parser = None
+
+def init_worker(yaml_file, width, height, cache_bytes, parse_cache):
+    global worker_parser
+    worker_parser = GagParser.from_file(yaml_file, gui.Canvas(width, height), parse_cache)
+    if cache_bytes: worker_parser.enable_cache(cache_bytes)
+
+def render_variant(job):
+    """ Render a single variant. The seed alone determines the result, no matter which worker renders it. """
+    (command_name, seed, filename, transparent) = job
+    canvas = worker_parser.gui
+    if transparent:
+        canvas.clear()
+    else:
+        canvas.fill(gui.Color())
+    worker_parser.execute(command_name, seed)
+    canvas.write_to_png(filename)
+    return filename
+
+def render_variants(yaml_file, command_name, count, base_seed = 0, output_directory = '.', processes = None, width = 640, height = 480, transparent = False, cache_bytes = None, parse_cache = None):
+    """ Render count variants of a command, seeded with base_seed, base_seed + 1, ...
+        Yields the filenames of finished variants in the order they are finished.
+    """
+    if not os.path.isdir(output_directory): os.makedirs(output_directory)
+    jobs = []
+    for seed in range(base_seed, base_seed + count):
+        filename = os.path.join(output_directory, '%s-%s.png' % (command_name, seed))
+        jobs.append( (command_name, seed, filename, transparent) )
+
+    if not processes: processes = multiprocessing.cpu_count()
+    # Update the parse cache once, so all workers find it complete, libraries are parsed on demand and not cached
+    if parse_cache and not os.path.isdir(yaml_file): GagParser(None, None).load(yaml_file, parse_cache)
+    pool = multiprocessing.Pool(processes, init_worker, (yaml_file, width, height, cache_bytes, parse_cache))
+    try:
+        # Hand out jobs in chunks to keep the inter-process overhead low, but small enough to balance the load
+        chunk_size = max(1, count // (processes * 4))
+        for filename in pool.imap_unordered(render_variant, jobs, chunk_size):
+            yield filename
+        pool.close()
+    except:
+        pool.terminate()
+        raise
+    finally:
+        pool.join()
+
+if __name__ == "__main__":
+    argument_parser = argparse.ArgumentParser(description = "Render seeded variants of a command into png files")
+    argument_parser.add_argument('yaml_file')
+    argument_parser.add_argument('command')
+    argument_parser.add_argument('count', type = int)
+    argument_parser.add_argument('--seed', type = int, default = 0, help = "seed of the first variant, every further variant uses the next seed")
+    argument_parser.add_argument('--output', default = 'variants', help = "output directory")
+    argument_parser.add_argument('--processes', type = int, default = None, help = "number of worker processes, defaults to the number of cores")
+    argument_parser.add_argument('--width', type = int, default = 640)
+    argument_parser.add_argument('--height', type = int, default = 480)
+    argument_parser.add_argument('--transparent', action = 'store_true', help = "render on a transparent instead of a white background")
+    argument_parser.add_argument('--cache', type = int, default = None, help = "cache rasterized deterministic commands, up to this many megabytes per worker")
+    argument_parser.add_argument('--parse-cache', default = None, help = "keep parsed definitions in this directory")
+    options = argument_parser.parse_args()
+
+    variants = render_variants(options.yaml_file, options.command, options.count, options.seed, options.output,
+        options.processes, options.width, options.height, options.transparent,
+        options.cache and options.cache * 1024 * 1024, options.parse_cache)
+    for (index, filename) in enumerate(variants):
+        print "%s/%s %s" % (index + 1, options.count, filename)
@@ -0,0 +1,160 @@
+# Benchmarks parsing and rendering of representative scenes, and compares the results against a baseline
+
+import argparse
+import json
+import multiprocessing
+import os
+import random
+import resource
+import sys
+import time
+import gui
+from parser import GagParser
+
+def recursion_scene(depth = 5000):
+    """ A single self-recursive command, nested depth levels deep """
+    return """
+- spiral:
+  - rotate: [7]
+  - rect: [0, 0, 4, 4, 'c(0.2,0.4,0.8,0.5)']
+  - spiral:
+      args: [3, 0, 0.9995]
+      kwargs:
+        stop_recursion:
+          max_depth: %d
+
+- deep_recursion:
+  - spiral: [320, 240, 1]
+""" % depth
+
+def pixels_scene(width = 400, height = 250):
+    """ width * height pixels in a single pixels primitive, every row in another color """
+    rows = []
+    for y in range(height):
+        row = ["[%d,%d]" % (x, y) for x in range(1, width)]
+        rows.append("[0,%d,'c(%.3f,0.5,0.5)'], %s" % (y, float(y) / height, ", ".join(row)))
+    return """
+- pixels_100k:
+  - translate: [120, 115]
+  - pixels: [ [%s] ]
+""" % ", ".join(rows)
+
+def polygons_scene(count = 5000, seed = 0):
+    """ count translucent triangles, spread over the whole canvas """
+    generator = random.Random(seed)
+    lines = []
+    for index in range(count):
+        (x, y) = (generator.uniform(0, 630), generator.uniform(0, 470))
+        lines.append("  - polygon: [[[%.1f,%.1f], [%.1f,%.1f], [%.1f,%.1f]], 'c(%.2f,%.2f,%.2f,0.5)']" % (
+            x, y, x + 10, y, x + 5, y + 8, generator.random(), generator.random(), generator.random()))
+    return "- polygons:\n%s\n" % "\n".join(lines)
+
+YAML_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'test.yaml')
+
+# Scenes are (name, yaml file or None, function returning the yaml text or None, command)
+SCENES = [
+    ('town', YAML_FILE, None, 'town'),
+    ('bighouse', YAML_FILE, None, 'bighouse'),
+    ('drawrecursiontest', YAML_FILE, None, 'drawrecursiontest'),
+    ('text', YAML_FILE, None, 'text'),
+    ('deep_recursion', None, recursion_scene, 'deep_recursion'),
+    ('pixels_100k', None, pixels_scene, 'pixels_100k'),
+    ('polygons', None, polygons_scene, 'polygons'),
+]
+
+# Metrics compared against the baseline, and whether higher values are better
+METRICS = {'parse_time':False, 'frames_per_second':True, 'ops_per_second':True, 'peak_memory_kb':False}
+
+def run_scene(scene, frames, seed, width, height):
+    """ Parse and render a scene frames times, always with the same seed. Runs in its own process, so the peak memory is its own. """
+    (name, yaml_file, generate, command_name) = scene
+    text = open(yaml_file, 'r').read() if yaml_file else generate()
+    canvas = gui.Canvas(width, height)
+    white = gui.Color()
+
+    start = time.time()
+    parser = GagParser(text, canvas)
+    parser.parse()
+    parse_time = time.time() - start
+
+    primitives = canvas.primitives
+    start = time.time()
+    for frame in range(frames):
+        canvas.fill(white)
+        parser.execute(command_name, seed)
+    canvas.flush()
+    render_time = max(time.time() - start, 1e-9)
+
+    return {
+        'parse_time':parse_time,
+        'render_time':render_time,
+        'frames':frames,
+        'frames_per_second':frames / render_time,
+        'ops_per_second':(canvas.primitives - primitives) / render_time,
+        # Kilobytes on linux
+        'peak_memory_kb':resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+    }
+
+def run_benchmarks(scene_names = None, frames = 10, seed = 0, width = 640, height = 480):
+    """ Returns a dictionary of scene names to results, see run_scene """
+    results = {}
+    for scene in SCENES:
+        if scene_names and scene[0] not in scene_names: continue
+        pool = multiprocessing.Pool(1)
+        try:
+            results[scene[0]] = pool.apply(run_scene, (scene, frames, seed, width, height))
+            pool.close()
+        except:
+            pool.terminate()
+            raise
+        finally:
+            pool.join()
+    return results
+
+def compare(results, baseline, threshold):
+    """ Compare results against baseline results. Returns a list of (scene, metric, baseline value, value, change, regressed)
+        tuples, change is the relative change in the direction of better values, a metric regressed if it got worse by more than threshold.
+    """
+    comparisons = []
+    for (name, scene_results) in sorted(results.items()):
+        if name not in baseline: continue
+        for (metric, higher_is_better) in sorted(METRICS.items()):
+            (old, new) = (baseline[name].get(metric), scene_results.get(metric))
+            if not old or new is None: continue
+            change = (new - old) / float(old)
+            if not higher_is_better: change = -change
+            comparisons.append( (name, metric, old, new, change, change < -threshold) )
+    return comparisons
+
+if __name__ == "__main__":
+    argument_parser = argparse.ArgumentParser(description = "Benchmark parsing and rendering of test.yaml and synthetic stress scenes")
+    argument_parser.add_argument('scenes', nargs = '*', help = "scenes to run, defaults to all of: %s" % ", ".join(scene[0] for scene in SCENES))
+    argument_parser.add_argument('--frames', type = int, default = 10, help = "frames rendered per scene")
+    argument_parser.add_argument('--seed', type = int, default = 0, help = "random seed of every frame")
+    argument_parser.add_argument('--width', type = int, default = 640)
+    argument_parser.add_argument('--height', type = int, default = 480)
+    argument_parser.add_argument('--output', default = 'benchmark.json', help = "write the results into this json file")
+    argument_parser.add_argument('--baseline', default = None, help = "compare against the results in this json file")
+    argument_parser.add_argument('--threshold', type = float, default = 0.1, help = "relative change that counts as a regression")
+    options = argument_parser.parse_args()
+
+    unknown = set(options.scenes) - set(scene[0] for scene in SCENES)
+    if unknown: argument_parser.error("Unknown scenes: %s" % ", ".join(sorted(unknown)))
+
+    results = run_benchmarks(options.scenes, options.frames, options.seed, options.width, options.height)
+    print "%-20s %10s %8s %12s %10s" % ('scene', 'parse (ms)', 'fps', 'ops/s', 'peak (kb)')
+    for (name, scene_results) in sorted(results.items()):
+        print "%-20s %10.1f %8.1f %12.0f %10d" % (name, scene_results['parse_time'] * 1000, scene_results['frames_per_second'],
+            scene_results['ops_per_second'], scene_results['peak_memory_kb'])
+    json.dump({'frames':options.frames, 'seed':options.seed, 'width':options.width, 'height':options.height, 'scenes':results},
+        open(options.output, 'w'), indent = 4, sort_keys = True)
+
+    if options.baseline:
+        baseline = json.load(open(options.baseline, 'r'))['scenes']
+        regressions = 0
+        for (name, metric, old, new, change, regressed) in compare(results, baseline, options.threshold):
+            print "%-20s %-18s %12.4g -> %12.4g %+7.1f%%%s" % (name, metric, old, new, change * 100, " REGRESSION" if regressed else "")
+            if regressed: regressions += 1
+        if regressions:
+            print "%s regressions of more than %s%%" % (regressions, options.threshold * 100)
+            sys.exit(1)
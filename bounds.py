@@ -0,0 +1,251 @@
+# Computes conservative bounding boxes of programs
+
+import math
+from executor import OP_DRAW, OP_TRANSFORM, OP_CALL, OP_INSTANCES, ARG_CONST, ARG_RANDOM, ARG_VARIABLE, ARG_LIST, ARG_UPDATE
+
+# Every number is an interval (low, high) of the values it can take, None stands for unknown values.
+# Bounding boxes are (left, top, right, bottom) tuples, EMPTY contains nothing.
+EMPTY = (float('inf'), float('inf'), float('-inf'), float('-inf'))
+IDENTITY = ((1, 1), (0, 0), (0, 0), (1, 1), (0, 0), (0, 0))
+
+def interval_add(a, b):
+    return (a[0] + b[0], a[1] + b[1])
+
+def interval_mul(a, b):
+    products = [a[0] * b[0], a[0] * b[1], a[1] * b[0], a[1] * b[1]]
+    return (min(products), max(products))
+
+def interval_hull(a, b):
+    if a is None or b is None: return None
+    return (min(a[0], b[0]), max(a[1], b[1]))
+
+def interval_cos(angle):
+    """ Range of cos over an interval of radians """
+    (low, high) = angle
+    if high - low >= 2 * math.pi: return (-1, 1)
+    values = [math.cos(low), math.cos(high)]
+    # Extremes at multiples of pi inside the interval
+    k = math.ceil(low / math.pi)
+    while k * math.pi <= high:
+        values.append(1 if k % 2 == 0 else -1)
+        k += 1
+    return (min(values), max(values))
+
+def interval_sin(angle):
+    return interval_cos((angle[0] - math.pi / 2, angle[1] - math.pi / 2))
+
+def compose(a, b):
+    """ Compose two interval matrices in cairo's (xx, yx, xy, yy, x0, y0) order, b is applied first """
+    (axx, ayx, axy, ayy, ax0, ay0) = a
+    (bxx, byx, bxy, byy, bx0, by0) = b
+    add = interval_add
+    mul = interval_mul
+    return (add(mul(axx, bxx), mul(axy, byx)), add(mul(ayx, bxx), mul(ayy, byx)),
+            add(mul(axx, bxy), mul(axy, byy)), add(mul(ayx, bxy), mul(ayy, byy)),
+            add(add(mul(axx, bx0), mul(axy, by0)), ax0), add(add(mul(ayx, bx0), mul(ayy, by0)), ay0))
+
+def transform_box(matrix, box):
+    if box is None: return None
+    if box == EMPTY: return EMPTY
+    (xx, yx, xy, yy, x0, y0) = matrix
+    x = (box[0], box[2])
+    y = (box[1], box[3])
+    (left, right) = interval_add(interval_add(interval_mul(xx, x), interval_mul(xy, y)), x0)
+    (top, bottom) = interval_add(interval_add(interval_mul(yx, x), interval_mul(yy, y)), y0)
+    return (left, top, right, bottom)
+
+def union(a, b):
+    if a is None or b is None: return None
+    return (min(a[0], b[0]), min(a[1], b[1]), max(a[2], b[2]), max(a[3], b[3]))
+
+def is_finite(box):
+    return box == EMPTY or all(abs(value) != float('inf') and value == value for value in box)
+
+def scale_matrix(amount):
+    return (amount, (0, 0), (0, 0), amount, (0, 0), (0, 0))
+
+def translate_matrix(x, y):
+    return ((1, 1), (0, 0), (0, 0), (1, 1), x, y)
+
+def rotate_matrix(degrees):
+    radians = (math.radians(degrees[0]), math.radians(degrees[1]))
+    cos = interval_cos(radians)
+    sin = interval_sin(radians)
+    return (cos, sin, (-sin[1], -sin[0]), cos, (0, 0), (0, 0))
+
+class BoundsCalculator(object):
+    """ Calculates bounding boxes of programs in their own coordinate system, using interval arithmetic.
+        Random arguments are bounded by their range, variables by their default and every value they are set to.
+        Self-recursive programs are unrolled up to their max_depth, programs with text, relatively updated
+        variables in their geometry, unlimited or mutual recursion get None, which means they are never culled.
+    """
+    def __init__(self, programs, gui):
+        self.programs = list(programs)
+        self.pixel_width = gui.pixel_width
+        self.pixel_height = gui.pixel_height
+        self.variable_intervals = self.find_variable_intervals()
+        self.results = {}
+
+    def find_variable_intervals(self):
+        """ Hull of the default and all values a program's variables are set to by any call """
+        intervals = {}
+        for program in self.programs:
+            intervals[program] = [self.interval(slot, []) for slot in program.variables]
+        # Widening a caller's variable widens what it passes on, until nothing changes anymore
+        changed = True
+        while changed:
+            changed = False
+            for program in self.programs:
+                for op in program.ops:
+                    if op[0] != OP_CALL: continue
+                    callee_intervals = intervals[op[1]]
+                    for (index, slot) in op[4]:
+                        value = None if slot[0] == ARG_UPDATE else self.interval(slot, intervals[program])
+                        hull = interval_hull(callee_intervals[index], value)
+                        if hull != callee_intervals[index]:
+                            callee_intervals[index] = hull
+                            changed = True
+        return intervals
+
+    def interval(self, slot, variables):
+        """ Interval of a number slot, or None. variables is a list of the intervals of the program's variables. """
+        (tag, value) = slot
+        if tag == ARG_CONST:
+            if type(value) in [int, float]: return (value, value)
+            return None
+        if tag == ARG_RANDOM: return (min(value[:2]), max(value[:2]))
+        if tag == ARG_VARIABLE: return variables[value] if value < len(variables) else None
+        return None
+
+    def intervals(self, args, dynamic, variables):
+        """ Intervals of args, lists become lists of intervals """
+        result = []
+        for arg in args:
+            slot = arg if dynamic else (ARG_CONST, arg)
+            if slot[0] == ARG_LIST:
+                result.append(self.intervals(slot[1], True, variables))
+            elif slot[0] == ARG_CONST and type(slot[1]) == list:
+                result.append(self.intervals(slot[1], False, variables))
+            else:
+                result.append(self.interval(slot, variables))
+        return result
+
+    def bounds(self, program):
+        if program in self.results: return self.results[program]
+        # Mutual recursion can't be bounded
+        self.results[program] = None
+        box = self.calculate(program)
+        if box is not None and not is_finite(box): box = None
+        self.results[program] = box
+        return box
+
+    def calculate(self, program):
+        variables = self.variable_intervals[program]
+        matrix = IDENTITY
+        box = EMPTY
+        recursions = []
+        for op in program.ops:
+            if op[0] == OP_DRAW:
+                (_, func, args, kwargs, dynamic) = op
+                box = union(box, transform_box(matrix, self.primitive_bounds(func.__name__, self.intervals(args, dynamic, variables))))
+
+            elif op[0] == OP_TRANSFORM:
+                (_, func, args, kwargs, dynamic) = op
+                args = self.intervals(args, dynamic, variables)
+                kwargs = dict((name, self.intervals([value], dynamic, variables)[0]) for (name, value) in kwargs.items())
+                transformation = self.transformation(func.__name__, args, kwargs)
+                if transformation is None: return None
+                matrix = compose(matrix, transformation)
+
+            elif op[0] == OP_INSTANCES:
+                (_, callee, instances, site, dynamic) = op
+                if callee is program: return None
+                (x, y, scale) = instances.intervals()
+                call_matrix = compose(matrix, compose(translate_matrix(x, y), scale_matrix(scale)))
+                box = union(box, transform_box(call_matrix, self.bounds(callee)))
+
+            else:
+                (_, callee, args, kwargs, var_updates, max_depth, site, dynamic) = op
+                args = self.intervals(args, dynamic, variables)
+                kwargs = dict((name, self.intervals([value], dynamic, variables)[0]) for (name, value) in kwargs.items())
+                transformation = self.transformation('transform', args, kwargs)
+                if transformation is None: return None
+                call_matrix = compose(matrix, transformation)
+                if callee is program:
+                    if max_depth is None: return None
+                    recursions.append( (call_matrix, max_depth) )
+                else:
+                    box = union(box, transform_box(call_matrix, self.bounds(callee)))
+            if box is None: return None
+
+        if not recursions: return box
+        # Every level of recursion draws the same ops again, transformed by a recursive call
+        # Every self-call is checked against its own limit, so the deepest one decides how deep the recursion goes
+        levels = max(max_depth for (_, max_depth) in recursions) - 1
+        local_box = box
+        for level in range(1, int(levels)):
+            previous = box
+            for (call_matrix, _) in recursions:
+                box = union(box, transform_box(call_matrix, previous))
+            box = union(local_box, box)
+            if box == previous or not is_finite(box): break
+        return box
+
+    def transformation(self, name, args, kwargs):
+        """ Interval matrix of a transformation with the same argument names and defaults as the gui, or None """
+        def arg(index, name, default = None):
+            if index < len(args): value = args[index]
+            elif name in kwargs: value = kwargs[name]
+            elif default is not None: value = (default, default)
+            else: return None
+            if type(value) != tuple: return None
+            return value
+
+        if name == 'scale':
+            parts = [arg(0, 'amount', 1)]
+        elif name == 'translate':
+            parts = [arg(0, 'x'), arg(1, 'y')]
+        elif name == 'rotate':
+            parts = [arg(0, 'angle')]
+        else:
+            parts = [arg(0, 'translate_x', 0), arg(1, 'translate_y', 0), arg(2, 'scale', 1)]
+        if None in parts: return None
+
+        if name == 'scale': return scale_matrix(*parts)
+        if name == 'translate': return translate_matrix(*parts)
+        if name == 'rotate': return rotate_matrix(*parts)
+        return compose(translate_matrix(parts[0], parts[1]), scale_matrix(parts[2]))
+
+    def primitive_bounds(self, name, args):
+        """ Bounding box of a primitive in the coordinate system it is drawn in """
+        try:
+            if name == 'draw_rect':
+                (x, y, width, height) = args[:4]
+                right = interval_add(x, width)
+                bottom = interval_add(y, height)
+                # Strokes can reach a bit further than the rectangle
+                return (min(x[0], right[0]) - 0.01, min(y[0], bottom[0]) - 0.01, max(x[1], right[1]) + 0.01, max(y[1], bottom[1]) + 0.01)
+            if name == 'draw_polygon':
+                box = EMPTY
+                for (x, y) in args[0]:
+                    box = union(box, (x[0] - 0.01, y[0] - 0.01, x[1] + 0.01, y[1] + 0.01))
+                return box
+            if name == 'draw_pixel':
+                return self.pixel_bounds(args[0], args[1])
+            if name == 'draw_pixels':
+                box = EMPTY
+                for pixel in args[0]:
+                    box = union(box, self.pixel_bounds(pixel[0], pixel[1]))
+                return box
+        except (TypeError, ValueError, IndexError):
+            pass
+        return None
+
+    def pixel_bounds(self, x, y):
+        return (x[0] * self.pixel_width, y[0] * self.pixel_height, (x[1] + 1) * self.pixel_width, (y[1] + 1) * self.pixel_height)
+
+def calculate_bounds(programs, gui):
+    """ Set the bounds of all programs """
+    calculator = BoundsCalculator(programs, gui)
+    for program in calculator.programs:
+        program.bounds = calculator.bounds(program)
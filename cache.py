@@ -0,0 +1,118 @@
+# Caches rasterized copies of deterministic commands
+
+import math
+import collections
+import cairo
+
+class RasterCache(object):
+    """ Least recently used cache of rasterized programs, bounded by the size of the rasterized surfaces in bytes.
+        Programs are rasterized once for every bucket of effective scale and rotation, and blitted with the exact
+        remaining transformation afterwards, so bucket sizes only influence sharpness, never positions.
+    """
+    def __init__(self, max_bytes = 64 * 1024 * 1024, scale_step = 0.05, rotation_step = 5):
+        self.max_bytes = max_bytes
+        self.scale_step = scale_step
+        self.rotation_step = math.radians(rotation_step)
+        self.entries = collections.OrderedDict()
+        # (program, bucket) keys of rasterized copies bigger than max_bytes, these programs are run directly instead
+        self.oversize = set()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def stats(self):
+        return {'hits':self.hits, 'misses':self.misses, 'evictions':self.evictions, 'entries':len(self.entries), 'bytes':self.bytes,
+            'oversize':len(self.oversize)}
+
+    def bucket(self, matrix):
+        """ Returns the (scale, rotation) bucket of a transformation matrix, or None for skewed or mirrored ones """
+        (xx, yx, xy, yy, x0, y0) = matrix
+        scale = math.sqrt(abs(xx * yy - xy * yx))
+        if not scale or abs(xx - yy) > 1e-6 * scale or abs(xy + yx) > 1e-6 * scale: return None
+        scale_bucket = int(round(math.log(scale) / math.log(1 + self.scale_step)))
+        rotation_bucket = int(round(math.atan2(yx, xx) / self.rotation_step))
+        return (scale_bucket, rotation_bucket)
+
+    def draw(self, executor, program):
+        """ Draw a program with the current transformation of the executor's gui """
+        gui = executor.gui
+        matrix = gui.get_matrix()
+        bucket = self.bucket(matrix)
+        if bucket is None:
+            executor.run(program)
+            return
+
+        key = (program, bucket)
+        if key in self.oversize:
+            executor.run(program)
+            return
+        entry = self.entries.pop(key, None)
+        if entry:
+            self.hits += 1
+            self.bytes -= entry[-1]
+        else:
+            self.misses += 1
+            entry = self.rasterize(executor, program, bucket)
+        if entry[-1] <= self.max_bytes:
+            self.entries[key] = entry
+            self.bytes += entry[-1]
+        else:
+            # It would never fit, so it isn't rasterized again
+            self.oversize.add(key)
+        # Only the most recently used entries are kept
+        while self.bytes > self.max_bytes:
+            (_, evicted) = self.entries.popitem(last = False)
+            self.bytes -= evicted[-1]
+            self.evictions += 1
+
+        (surface, bucket_matrix, x, y, color, size) = entry
+        if surface:
+            gui.flush_batches()
+            gui.apply_matrix()
+            context = gui.cairo_context
+            context.save()
+            context.transform(bucket_matrix)
+            context.set_source_surface(surface, x, y)
+            context.paint()
+            context.restore()
+        if color:
+            gui.set_color(color)
+
+    def rasterize(self, executor, program, bucket):
+        """ Render a program with the scale and rotation of a bucket into a surface just big enough for it.
+            Returns a (surface, inverted bucket matrix, x, y, color, size in bytes) entry, color is the last
+            color set by the program, so drawing from the cache leaves the gui in the same state.
+        """
+        gui = executor.gui
+        (scale_bucket, rotation_bucket) = bucket
+        bucket_matrix = cairo.Matrix.init_rotate(rotation_bucket * self.rotation_step)
+        scale = (1 + self.scale_step) ** scale_bucket
+        bucket_matrix.scale(scale, scale)
+
+        # Record the program first to find out how much space it needs
+        recording = cairo.RecordingSurface(cairo.CONTENT_COLOR_ALPHA, None)
+        gui.push_target(recording)
+        try:
+            gui.set_matrix(bucket_matrix)
+            color_changes = gui.color_changes
+            executor.run(program)
+            color = gui.get_color() if gui.color_changes != color_changes else None
+        finally:
+            gui.pop_target()
+
+        (x, y, width, height) = recording.ink_extents()
+        left = int(math.floor(x))
+        top = int(math.floor(y))
+        width = int(math.ceil(x + width)) - left
+        height = int(math.ceil(y + height)) - top
+        bucket_matrix.invert()
+        if width <= 0 or height <= 0:
+            return (None, bucket_matrix, 0, 0, color, 0)
+
+        surface = cairo.ImageSurface(cairo.FORMAT_ARGB32, width, height)
+        context = cairo.Context(surface)
+        context.set_source_surface(recording, -left, -top)
+        context.paint()
+        surface.flush()
+        return (surface, bucket_matrix, left, top, color, surface.get_stride() * height)
@@ -0,0 +1,331 @@
+# Executes compiled drawing programs
+
+import gui
+import random
+import rng
+from itertools import chain
+
+# Opcodes of compiled operations
+OP_DRAW = 0         # (OP_DRAW, gui_method, args, kwargs, dynamic)
+OP_TRANSFORM = 1    # (OP_TRANSFORM, gui_method, args, kwargs, dynamic)
+OP_CALL = 2         # (OP_CALL, program, args, kwargs, var_updates, max_depth, site, dynamic), var_updates are (callee variable index, slot) tuples
+OP_INSTANCES = 3    # (OP_INSTANCES, program, instancing.Instances, site, dynamic)
+# The site of a call tells it apart from all other calls of the same program, the called program's random numbers are drawn
+# from a stream derived from the caller's stream and the site, see rng.child_key
+
+# Tags of argument slots. Slots are (tag, payload) tuples.
+ARG_CONST = 0       # payload is the value itself
+ARG_RANDOM = 1      # payload is a (from, to, index) tuple, index is the position of the value in the random block of the running program
+ARG_VARIABLE = 2    # payload is the index of a variable of the executed program in its environment
+ARG_COLOR = 3       # payload is a list of (r, g, b, a) slots
+ARG_LIST = 4        # payload is a list of slots
+ARG_UPDATE = 5      # payload is an (operator, operand slot) tuple, only valid in recursion vars
+
+class Program(object):
+    """ A compiled command. Ops are flat tuples, see the OP_* constants.
+        If an op is not dynamic, its args and kwargs are plain values and can be passed on directly,
+        otherwise they are slots which have to be evaluated every time the op is executed.
+    """
+    def __init__(self, name):
+        self.name = name
+        self.ops = []
+        # Variables are resolved to indices at compile time, at runtime their values are kept in environment lists
+        self.variable_names = []
+        self.variable_index = {}
+        self.variables = []
+        self.variable_order = []
+        self.constant_variables = []
+        # The (from, to) ranges of all random arguments, a block of values for them is drawn whenever the program is run
+        self.random_ranges = []
+        # Set by the parser: pixels without a color use whatever color was set before
+        self.uses_current_color = False
+        # Set by mark_deterministic: the program draws exactly the same thing every time
+        self.deterministic = False
+        # Set by mark_random: the program or one of its sub-commands draws random numbers
+        self.uses_random = False
+        # Set by mark_color: sites of calls that must not be culled, because the color they leave set is used afterwards
+        self.color_sites = set()
+        # Set by bounds.calculate_bounds: (left, top, right, bottom) in the program's coordinates, None if unknown
+        self.bounds = None
+
+    def set_variables(self, names, defaults):
+        """ Set the names of the program's variables and the slots of their default values, the index of a name is the index of its value.
+            Defaults referring to other variables are evaluated after them.
+        """
+        self.variable_names = names
+        self.variable_index = dict((name, index) for (index, name) in enumerate(names))
+        self.variables = defaults
+        if all(slot[0] == ARG_CONST for slot in defaults):
+            self.constant_variables = [slot[1] for slot in defaults]
+        else:
+            self.constant_variables = None
+
+        self.variable_order = []
+        def add(index, referring):
+            if index in self.variable_order or index in referring: return
+            for reference in slot_variables(defaults[index]):
+                add(reference, referring + [index])
+            self.variable_order.append(index)
+        for index in range(len(defaults)):
+            add(index, [])
+
+    def __repr__(self):
+        return "Program %s: %s" % (self.name, self.ops)
+
+def mark_deterministic(programs):
+    """ Find programs that draw the same thing every time they are run: they have no random or variable arguments,
+        no pixels depending on the current color and only call deterministic programs. Recursive programs are never deterministic.
+    """
+    results = {}
+    def is_deterministic(program):
+        if program in results: return results[program]
+        # Until the program is done, a recursive call finds it non-deterministic
+        results[program] = False
+        deterministic = not program.uses_current_color
+        for op in program.ops:
+            if op[-1] or (op[0] in (OP_CALL, OP_INSTANCES) and not is_deterministic(op[1])):
+                deterministic = False
+        results[program] = deterministic
+        return deterministic
+
+    for program in programs:
+        program.deterministic = is_deterministic(program)
+
+def slot_variables(slot):
+    """ Indices of all variables a slot refers to """
+    (tag, value) = slot
+    if tag == ARG_VARIABLE: return [value]
+    if tag in (ARG_COLOR, ARG_LIST): return [index for item in value for index in slot_variables(item)]
+    if tag == ARG_UPDATE: return slot_variables(value[1])
+    return []
+
+def mark_random(programs):
+    """ Find programs that draw random numbers when they are run, in their variables, arguments or sub-commands """
+    programs = list(programs)
+    for program in programs:
+        program.uses_random = bool(program.random_ranges) or any(op[0] == OP_INSTANCES and op[2].random for op in program.ops)
+    # Callers of programs drawing random numbers draw them as well, until nothing changes anymore
+    changed = True
+    while changed:
+        changed = False
+        for program in programs:
+            if not program.uses_random and any(op[0] in (OP_CALL, OP_INSTANCES) and op[1].uses_random for op in program.ops):
+                program.uses_random = True
+                changed = True
+
+def mark_color(programs):
+    """ Find calls that must not be culled: the called program sets a color, and a pixel without a color drawn
+        after it, by the caller or anything that runs after the caller, would use that color.
+    """
+    programs = list(programs)
+    calls = lambda program: [op for op in program.ops if op[0] in (OP_CALL, OP_INSTANCES)]
+    # Whether a program, or one of its sub-commands, sets or uses the current color
+    sets_color = dict((program, any(op[0] == OP_DRAW for op in program.ops)) for program in programs)
+    reads_color = dict((program, program.uses_current_color) for program in programs)
+    changed = True
+    while changed:
+        changed = False
+        for program in programs:
+            if not sets_color[program] and any(sets_color[op[1]] for op in calls(program)):
+                sets_color[program] = changed = True
+            if not reads_color[program] and any(reads_color[op[1]] for op in calls(program)):
+                reads_color[program] = changed = True
+
+    def read_after(program, continued):
+        """ Whether the current color is used after each op of a program, continued tells whether it is used after the program """
+        after = []
+        value = continued
+        for op in reversed(program.ops):
+            after.append(value)
+            if op[0] == OP_DRAW: value = value or program.uses_current_color
+            else: value = value or (op[0] in (OP_CALL, OP_INSTANCES) and reads_color[op[1]])
+        after.reverse()
+        return after
+
+    # Whether the current color is used after a program finished, by any of its callers, until nothing changes anymore
+    continued = dict((program, False) for program in programs)
+    changed = True
+    while changed:
+        changed = False
+        for program in programs:
+            after = read_after(program, continued[program])
+            for (index, op) in enumerate(program.ops):
+                if op[0] not in (OP_CALL, OP_INSTANCES): continue
+                # Instances run one after another, so every one of them is followed by the next
+                value = after[index] or (op[0] == OP_INSTANCES and reads_color[op[1]])
+                if value and not continued[op[1]]:
+                    continued[op[1]] = changed = True
+
+    for program in programs:
+        after = read_after(program, continued[program])
+        program.color_sites = set()
+        for (index, op) in enumerate(program.ops):
+            if op[0] == OP_CALL and sets_color[op[1]] and after[index]:
+                program.color_sites.add(op[6])
+            elif op[0] == OP_INSTANCES and sets_color[op[1]] and (after[index] or reads_color[op[1]]):
+                program.color_sites.update(op[2].sites())
+
+class Executor(object):
+    """ Runs compiled programs on a gui.
+        Sub-commands are not run recursively, instead the executor keeps its own stack of frames.
+        Every frame holds the remaining ops of a program, its variables, its recursion depth, the
+        transformation matrix to restore once it is finished, and the key and block of its random numbers,
+        so recursion is only limited by max_stack_depth.
+    """
+    def __init__(self, gui, max_stack_depth = 100000, cache = None, lod_threshold = 0):
+        self.gui = gui
+        self.max_stack_depth = max_stack_depth
+        # An optional cache.RasterCache, deterministic sub-commands are then drawn from it
+        self.cache = cache
+        # Sub-commands outside of the viewport, or smaller than lod_threshold device pixels, are skipped
+        self.lod_threshold = lod_threshold
+        self.culled_offscreen = 0
+        self.culled_small = 0
+        # An optional profiler.Profiler, which is told about every program that is started and finished
+        self.profiler = None
+
+    def run(self, program, seed = None):
+        """ Run a program with its default variables. Runs with the same seed draw the same random numbers,
+            without a seed it is drawn from the random module.
+        """
+        gui = self.gui
+        evaluate_args = self.evaluate_args
+        viewport = gui.viewport()
+        profiler = self.profiler
+        if profiler: profiler.enter(program, 0)
+        key = None
+        randoms = ()
+        if program.uses_random:
+            if seed is None: seed = random.getrandbits(64)
+            key = rng.root_key(seed)
+            randoms = rng.block(key, program.random_ranges)
+        stack = [(iter(program.ops), program, self.initial_env(program, randoms), 0, gui.get_matrix(), key, randoms)]
+        while stack:
+            (ops, program, env, depth, matrix, key, randoms) = stack[-1]
+            for op in ops:
+                opcode = op[0]
+                if opcode == OP_DRAW:
+                    (_, func, args, kwargs, dynamic) = op
+                    if dynamic:
+                        (args, kwargs) = evaluate_args(args, kwargs, env, randoms)
+                    func(*args, **kwargs)
+
+                elif opcode == OP_TRANSFORM:
+                    (_, func, args, kwargs, dynamic) = op
+                    if dynamic:
+                        (args, kwargs) = evaluate_args(args, kwargs, env, randoms)
+                    func(*args, **kwargs)
+
+                elif opcode == OP_INSTANCES:
+                    # Every instance is a plain call, run before the remaining ops of the frame
+                    (_, callee, instances, site, dynamic) = op
+                    calls = instances.calls(rng.child_key(key, site) if dynamic else None)
+                    stack[-1] = (chain(calls, ops), program, env, depth, matrix, key, randoms)
+                    break
+
+                else:
+                    (_, callee, args, kwargs, var_updates, max_depth, site, dynamic) = op
+                    callee_depth = depth + 1 if callee is program else 0
+                    if max_depth is not None and callee_depth >= max_depth - 1:
+                        continue
+
+                    if dynamic:
+                        (args, kwargs) = evaluate_args(args, kwargs, env, randoms)
+
+                    call_matrix = gui.get_matrix()
+                    gui.transform(*args, **kwargs)
+                    # Every sub-command draws from a stream of its own, so skipping one doesn't change the random numbers of the others
+                    # Calls leaving a color set that is used afterwards are never culled, see mark_color
+                    if viewport and callee.bounds and site not in program.color_sites and self.is_culled(callee.bounds, viewport):
+                        gui.set_matrix(call_matrix)
+                        continue
+
+                    if self.cache is not None and callee.deterministic:
+                        # Draw a rasterized copy instead of running the sub-command again
+                        self.cache.draw(self, callee)
+                        gui.set_matrix(call_matrix)
+                        continue
+
+                    if len(stack) >= self.max_stack_depth:
+                        raise Exception("Maximum stack depth of %s exceeded in %s" % (self.max_stack_depth, callee.name))
+                    if callee.uses_random:
+                        callee_key = rng.child_key(key, site)
+                        callee_randoms = rng.block(callee_key, callee.random_ranges) if callee.random_ranges else ()
+                    else:
+                        callee_key = None
+                        callee_randoms = ()
+                    # Self-recursive calls continue with the current variables, other commands start fresh
+                    callee_env = env if callee is program else self.initial_env(callee, callee_randoms)
+                    if var_updates:
+                        callee_env = self.update_env(callee_env, var_updates, env, randoms)
+                    # Descend into the sub-command, the current frame continues where it left off once it is finished
+                    stack.append( (iter(callee.ops), callee, callee_env, callee_depth, call_matrix, callee_key, callee_randoms) )
+                    if profiler: profiler.enter(callee, callee_depth)
+                    break
+            else:
+                # All ops of the frame are done, undo its transformations
+                stack.pop()
+                gui.set_matrix(matrix)
+                # Shapes may still be waiting to be filled together, see Canvas._batch
+                if not stack: gui.flush_batches()
+                if profiler: profiler.leave(program)
+
+    def is_culled(self, bounds, viewport):
+        """ Check whether bounds in the current coordinates are outside of the viewport or too small to matter """
+        (left, top, right, bottom) = bounds
+        if left > right:
+            # Nothing is drawn at all
+            self.culled_small += 1
+            return True
+        matrix = self.gui.get_matrix()
+        corners = [gui.transform_point(matrix, x, y) for (x, y) in ((left, top), (right, top), (left, bottom), (right, bottom))]
+        xs = [x for (x, y) in corners]
+        ys = [y for (x, y) in corners]
+        # Antialiasing can reach into the next device pixel
+        if min(xs) - 1 > viewport[2] or max(xs) + 1 < viewport[0] or min(ys) - 1 > viewport[3] or max(ys) + 1 < viewport[1]:
+            self.culled_offscreen += 1
+            return True
+        if max(max(xs) - min(xs), max(ys) - min(ys)) < self.lod_threshold:
+            self.culled_small += 1
+            return True
+        return False
+
+    def initial_env(self, program, randoms):
+        """ Get the default variables of a program, random defaults are taken from the program's block of random numbers """
+        if program.constant_variables is not None:
+            return program.constant_variables
+        env = [None] * len(program.variables)
+        for index in program.variable_order:
+            env[index] = self.evaluate(program.variables[index], env, randoms)
+        return env
+
+    def update_env(self, env, var_updates, caller_env, caller_randoms):
+        """ Returns a copy of env with var_updates, a list of (variable index, slot) tuples, applied.
+            Relative updates are applied to the value in env, operands are evaluated in the caller's environment.
+        """
+        env = list(env)
+        for (index, slot) in var_updates:
+            if slot[0] == ARG_UPDATE:
+                (operator, operand) = slot[1]
+                env[index] = operator(env[index], self.evaluate(operand, caller_env, caller_randoms))
+            else:
+                env[index] = self.evaluate(slot, caller_env, caller_randoms)
+        return env
+
+    def evaluate_args(self, args, kwargs, env, randoms):
+        """ Evaluate argument slots into values """
+        evaluate = self.evaluate
+        evaluated_kwargs = {}
+        for (name, slot) in kwargs.items():
+            evaluated_kwargs[name] = evaluate(slot, env, randoms)
+        return ([evaluate(slot, env, randoms) for slot in args], evaluated_kwargs)
+
+    def evaluate(self, slot, env, randoms):
+        """ Evaluate a single argument slot """
+        (tag, value) = slot
+        if tag == ARG_CONST: return value
+        if tag == ARG_VARIABLE: return env[value]
+        if tag == ARG_RANDOM: return randoms[value[2]]
+        if tag == ARG_COLOR: return gui.Color(*[self.evaluate(item, env, randoms) for item in value])
+        if tag == ARG_LIST: return [self.evaluate(item, env, randoms) for item in value]
+        raise Exception("Relative updates are only allowed in recursion vars")
@@ -1,9 +1,39 @@
+import argparse
+import shlex
 import gui
 import random
+import writer
 from parser import GagParser
 import time
+import json
 
 if __name__ == "__main__":
+    argument_parser = argparse.ArgumentParser(description = "Render a command in a window, frame after frame")
+    argument_parser.add_argument('command', nargs = '?', default = 'drawrecursiontest')
+    argument_parser.add_argument('--yaml', default = 'test.yaml')
+    argument_parser.add_argument('--parse-cache', default = None, help = "keep parsed definitions in this directory")
+    argument_parser.add_argument('--fps', type = int, default = 50)
+    argument_parser.add_argument('--frames', type = int, default = None, help = "stop after this many frames")
+    argument_parser.add_argument('--cache', type = int, default = None, help = "cache rasterized deterministic commands, up to this many megabytes")
+    argument_parser.add_argument('--profile', nargs = '?', const = '-', default = None,
+        help = "print statistics of every command when done, or write them into this json file")
+    argument_parser.add_argument('--lod', type = float, default = 0, help = "skip sub-commands smaller than this many pixels")
+    output = argument_parser.add_mutually_exclusive_group()
+    output.add_argument('--png', default = 'frame-%03d.png', help = "write every frame into a png file, the pattern is formatted with the frame number")
+    output.add_argument('--pipe', help = "pipe raw bgra frames into this encoder command")
+    output.add_argument('--animation', help = "write all frames into an animated file using ffmpeg, e.g. animation.mp4")
+    output.add_argument('--no-output', action = 'store_true', help = "don't write any frames")
+    options = argument_parser.parse_args()
+
+    if options.no_output:
+        frame_writer = None
+    elif options.pipe:
+        frame_writer = writer.PipeWriter(shlex.split(options.pipe))
+    elif options.animation:
+        frame_writer = writer.AnimationWriter(options.animation, options.fps)
+    else:
+        frame_writer = writer.PngSequenceWriter(options.png)
+
     test_gui = gui.Gui()
     white = gui.Color()
     gray = gui.Color(0.5, 0.5, 0.5, 0.3)
@@ -12,15 +42,18 @@ if __name__ == "__main__":
 
     test_gui.fill(white)
 
-    f = open('test.yaml', 'r')
-    parser = GagParser(f.read(), test_gui)
-    parser.parse()
+    load_start = time.time()
+    parser = GagParser.from_file(options.yaml, test_gui, options.parse_cache)
+    load_time = time.time() - load_start
+    profile = parser.enable_profiling() if options.profile else None
+    if options.cache: parser.enable_cache(options.cache * 1024 * 1024)
+    parser.executor.lod_threshold = options.lod
 
     frame = 0
     try:
-        while True:
+        while options.frames is None or frame < options.frames:
             #if not loop_count % 100: test_gui.fill(white)
-            time_passed = test_gui.clock.tick(50)
+            time_passed = test_gui.clock.tick(options.fps)
             #print "%s fps" % (1000/time_passed)
 
             #test_gui.draw_circle((random.randint(0,640), random.randint(0,480)), 50, fill_color = gray, stroke_color = gray.replace(r=1))
@@ -31,16 +64,26 @@ if __name__ == "__main__":
             #test_gui.draw_text(300,300,"hallo", red)
 
             test_gui.fill(white)
-            #parser.execute('bighouse')
-            #parser.execute('town')
-            #parser.execute('text')
-            parser.execute('drawrecursiontest')
+            parser.execute(options.command)
 
             test_gui.update()
 
-            test_gui.cairo_surface.write_to_png("frame-%s.png" % str(frame).zfill(3))
+            # Frames are encoded in the background while the next one is rendered
+            if frame_writer: frame_writer.write(test_gui)
 
             frame += 1
             #time.sleep(1)
     except KeyboardInterrupt:
-        test_gui.cairo_surface.write_to_png("example.png")
\ No newline at end of file
+        test_gui.write_to_png("example.png")
+    finally:
+        if frame_writer: frame_writer.close()
+        print "Culled %s sub-commands outside of the window and %s smaller than %s pixels in %s frames" % (
+            parser.executor.culled_offscreen, parser.executor.culled_small, options.lod, frame)
+        if options.profile == '-':
+            print "Loaded %s in %.1f ms" % (options.yaml, load_time * 1000)
+            print profile.format_report()
+        elif options.profile:
+            report = profile.report()
+            report['load_time'] = load_time
+            report['frames'] = frame
+            json.dump(report, open(options.profile, 'w'), indent = 4, sort_keys = True)
@@ -1,11 +1,16 @@
 import math
-import pygame
+import sys
 import cairo
 import numpy
-import Image
 import random
 import copy
 
+# The pygame window is only needed to display the surface, headless rendering works without it
+try:
+    import pygame
+except ImportError:
+    pygame = None
+
 class Color(object):
     def __init__(self, r = 1, g = 1, b = 1, a = 1):
         self.r = r
@@ -21,34 +26,76 @@ class Color(object):
         if not a: a = self.a
         return Color(r,g,b,a)
 
+    def __eq__(self, other):
+        return isinstance(other, Color) and (self.r, self.g, self.b, self.a) == (other.r, other.g, other.b, other.a)
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __hash__(self):
+        return hash((self.r, self.g, self.b, self.a))
+
     def __repr__(self):
         return 'Color object: (%s,%s,%s,%s)' % (self.r, self.g, self.b, self.a)
 
-class Gui(object):
-    def __init__(self, width = 640, height = 480, caption = "DisplayTest", textureDirectory = "textures", virtual_width = None, virtual_height = None):
-        """ Initialize a pygame window. This is only for early testing, there probably won't be a gui later. """
-        pygame.init()
-        screen = pygame.display.set_mode((width,height))
-        pygame.display.set_caption(caption)
-        
-        background = pygame.Surface(screen.get_size())
-        background.fill((255, 255, 255))
-        
-        screen.blit(background, (0, 0))
-        pygame.display.flip()
-
+# Limits of the batches of shapes waiting to be filled, see Canvas._batch
+MAX_BATCHES = 8
+MAX_TRANSLUCENT_BATCH = 32
+
+# Transformation matrices are (xx, yx, xy, yy, x0, y0) tuples, in the order of the values of a cairo.Matrix
+IDENTITY = (1.0, 0.0, 0.0, 1.0, 0.0, 0.0)
+
+# The source color of new cairo contexts
+BLACK = Color(0, 0, 0)
+
+def transform_point(matrix, x, y):
+    (xx, yx, xy, yy, x0, y0) = matrix
+    return (xx * x + xy * y + x0, yx * x + yy * y + y0)
+
+def boxes_overlap(a, b):
+    """ Check whether two (left, top, right, bottom) boxes overlap, boxes only touching each other don't """
+    return a[0] < b[2] - 1e-9 and b[0] < a[2] - 1e-9 and a[1] < b[3] - 1e-9 and b[1] < a[3] - 1e-9
+
+def convex_polygons_overlap(a, b):
+    """ Check whether two convex polygons overlap, using their edges as separating axes. Polygons only touching each other don't. """
+    for points in (a, b):
+        for index in range(len(points)):
+            (x0, y0) = points[index - 1]
+            (x1, y1) = points[index]
+            (axis_x, axis_y) = (y0 - y1, x1 - x0)
+            a_values = [x * axis_x + y * axis_y for (x, y) in a]
+            b_values = [x * axis_x + y * axis_y for (x, y) in b]
+            epsilon = 1e-9 * (abs(axis_x) + abs(axis_y))
+            if max(a_values) <= min(b_values) + epsilon or max(b_values) <= min(a_values) + epsilon: return False
+    return True
+
+class Canvas(object):
+    def __init__(self, width = 640, height = 480, textureDirectory = "textures", virtual_width = None, virtual_height = None):
+        """ Initialize an offscreen cairo surface with all drawing functions, without any window. """
         data = numpy.empty(width * height * 4, dtype=numpy.int8)
 
+        self.data = data
         self.cairo_surface = cairo.ImageSurface.create_for_data(data, cairo.FORMAT_ARGB32, width, height, width * 4)
-        self.cairo_context = cairo.Context(self.cairo_surface)  
-        self.cairo_context.set_antialias(cairo.ANTIALIAS_SUBPIXEL)
-        self.cairo_context.set_line_width(0.01)
+        self.cairo_context = self._create_context(self.cairo_surface)
+        # The current transformation. Transformations only change this matrix, it is set on the cairo context
+        # by apply_matrix when something is drawn with the context, cairo_matrix is the one set there.
+        self.matrix = IDENTITY
+        self.cairo_matrix = IDENTITY
+        # The current color, set on the cairo context by apply_color when something is filled with the context's source,
+        # cairo_color is the one set there. New cairo contexts start with an opaque black source.
+        self.color = self.cairo_color = BLACK
+        self.targets = []
+        self.color_changes = 0
+        # Statistics for profiling: primitives drawn, cairo fills and strokes
+        self.primitives = 0
+        self.fills = 0
+        self.strokes = 0
+        # Shapes waiting to be filled at once, [rgba, shapes, box, boxes] lists in the order they have to be filled, see _batch
+        self.batches = []
 
-        self.screen = screen
         self.textureDirectory = textureDirectory
         self.width = width
         self.height = height
-        self.clock = pygame.time.Clock()
 
         # Set virtual resolution for pixel stuff
         self.virtual_width = width 
@@ -63,44 +110,288 @@ class Gui(object):
             self.virtual_height = virtual_height
             self.pixel_height = height / virtual_height
 
+    def _create_context(self, surface):
+        context = cairo.Context(surface)
+        context.set_antialias(cairo.ANTIALIAS_SUBPIXEL)
+        context.set_line_width(0.01)
+        return context
+
+    def push_target(self, surface):
+        """ Draw onto another cairo surface, for example to render something offscreen, until pop_target() is called """
+        self.flush_batches()
+        self.targets.append( (self.cairo_surface, self.cairo_context, self.data, self.matrix, self.cairo_matrix, self.color, self.cairo_color) )
+        self.cairo_surface = surface
+        self.cairo_context = self._create_context(surface)
+        self.data = None
+        self.matrix = self.cairo_matrix = IDENTITY
+        self.color = self.cairo_color = BLACK
+
+    def pop_target(self):
+        self.flush_batches()
+        (self.cairo_surface, self.cairo_context, self.data, self.matrix, self.cairo_matrix, self.color, self.cairo_color) = self.targets.pop()
+
+    def viewport(self):
+        """ Returns the (left, top, right, bottom) device coordinates of the visible area, or None while drawing onto another target """
+        if self.targets: return None
+        return (0, 0, self.width, self.height)
+
+    def flush(self):
+        """ Finish all pending drawing, call this before using the surface data """
+        self.flush_batches()
+        self.cairo_surface.flush()
+
+    def flush_batches(self, count = None):
+        """ Fill the shapes collected by _batch, every batch with a single fill. Only the oldest count batches are filled if count is given. """
+        if not self.batches: return
+        batches = self.batches[:count]
+        context = self.cairo_context
+        context.save()
+        context.identity_matrix()
+        for (rgba, shapes, box, boxes) in batches:
+            context.set_source_rgba(*rgba)
+            for points in shapes:
+                context.move_to(*points[0])
+                for (x, y) in points[1:]:
+                    context.line_to(x, y)
+                context.close_path()
+            context.fill()
+            self.fills += 1
+        context.restore()
+        self.batches = self.batches[len(batches):]
+
+    def _batch(self, color, points):
+        """ Add a shape, given by the corners of a polygon turning in only one direction, to the shapes which are filled
+            together with the same color. The shape joins the latest batch of its color unless it overlaps anything which
+            has to be drawn after that batch, so the order of drawing only changes where it doesn't make a difference.
+            Translucent shapes must not overlap other shapes of their batch either, because a fill covers every pixel once.
+        """
+        (xx, yx, xy, yy, x0, y0) = self.matrix
+        points = [(xx * x + xy * y + x0, yx * x + yy * y + y0) for (x, y) in points]
+        xs = [x for (x, y) in points]
+        ys = [y for (x, y) in points]
+        box = (min(xs), min(ys), max(xs), max(ys))
+        # Overlapping shapes are only filled as their union if they all wind the same way
+        area = 0
+        for index in range(len(points)):
+            area += points[index - 1][0] * points[index][1] - points[index][0] * points[index - 1][1]
+        if area < 0: points.reverse()
+
+        self.set_color(color)
+        rgba = (color.r, color.g, color.b, color.a)
+        translucent = color.a < 1
+        for batch in reversed(self.batches):
+            (batch_rgba, shapes, batch_box, boxes) = batch
+            if batch_rgba == rgba and not (translucent and (len(boxes) >= MAX_TRANSLUCENT_BATCH or
+                    self._overlaps_any(points, box, shapes, boxes))):
+                shapes.append(points)
+                if translucent: boxes.append(box)
+                batch[2] = (min(box[0], batch_box[0]), min(box[1], batch_box[1]), max(box[2], batch_box[2]), max(box[3], batch_box[3]))
+                return
+            if boxes_overlap(box, batch_box): break
+
+        if len(self.batches) >= MAX_BATCHES:
+            # Filling the oldest batches early doesn't change anything, everything else is drawn after them anyway
+            self.flush_batches(MAX_BATCHES // 2)
+        self.batches.append( [rgba, [points], box, [box] if translucent else []] )
+
+    def _overlaps_any(self, points, box, shapes, boxes):
+        """ Check whether a shape overlaps any of shapes. Rectangles are parallelograms in device coordinates,
+            so their exact overlap can be checked, other shapes overlap if their boxes do.
+        """
+        for (other, other_box) in zip(shapes, boxes):
+            if boxes_overlap(box, other_box):
+                if len(points) != 4 or len(other) != 4 or convex_polygons_overlap(points, other): return True
+        return False
+
     def fill(self, color):
         """ Fill the entire surface with one color """
+        self.flush_batches()
         self.set_color(color)
+        self.apply_color()
+        self.cairo_context.paint()
+
+    def clear(self):
+        """ Make the entire surface transparent """
+        self.flush_batches()
+        self.cairo_context.save()
+        self.cairo_context.set_operator(cairo.OPERATOR_CLEAR)
         self.cairo_context.paint()
+        self.cairo_context.restore()
 
     def draw_circle(self, center, radius, fill_color = None, stroke_color = None):
         """ Draw a circle at center, with a given radius and optional fill_color and stroke_color """
         (x, y) = center
+        self.primitives += 1
+        self.flush_batches()
+        self.apply_matrix()
         self.cairo_context.arc(x, y, radius, 0, 2 * math.pi)
         self.apply_colors(fill_color, stroke_color)
         self.cairo_context.close_path()
 
     def draw_rect(self, x, y, width, height, fill_color = None, stroke_color = None):
-        """ Draw a rectangle with its upper left corner at x,y, size of width,height and optional fill_color and stroke_color """
+        """ Draw a rectangle with its upper left corner at x,y, size of width,height and optional fill_color and stroke_color.
+            Rectangles without a stroke are filled in batches, see _batch.
+        """
+        self.primitives += 1
+        if fill_color and not stroke_color:
+            self._batch(fill_color, [(x, y), (x + width, y), (x + width, y + height), (x, y + height)])
+            return
+        self.flush_batches()
+        self.apply_matrix()
         self.cairo_context.rectangle(x, y, width, height)
         self.apply_colors(fill_color, stroke_color)
         self.cairo_context.close_path()
 
     def draw_pixel(self, x, y, color = None):
-        """ Draw a virtual pixel. The size of the pixel is determined by Gui.virtual_width and Gui.virtual_height """
+        """ Draw a virtual pixel. The size of the pixel is determined by Gui.virtual_width and Gui.virtual_height.
+            Pixels are filled in batches, see _batch.
+        """
+        self.primitives += 1
+        if not color: color = self.get_color()
+        if color:
+            (left, top) = (x * self.pixel_width, y * self.pixel_height)
+            (right, bottom) = (left + self.pixel_width, top + self.pixel_height)
+            self._batch(color, [(left, top), (right, top), (right, bottom), (left, bottom)])
+            return
+        self.flush_batches()
+        self.apply_matrix()
         self.cairo_context.rectangle(x * self.pixel_width, y * self.pixel_height, self.pixel_width, self.pixel_height)        
         if color: self.set_color(color)
+        self.apply_color()
         self.cairo_context.fill()
+        self.fills += 1
         self.cairo_context.new_path()
 
     def draw_pixels(self, pixels):
+        """ Draw many virtual pixels at once. Pixels are (x, y[, color]) lists, pixels without a color use the previous color.
+            If the pixels are aligned to device pixels, they are written straight into the surface data,
+            otherwise every run of pixels with the same color is filled as a single path.
+        """
+        if not pixels: return
+        self.primitives += len(pixels)
+        self.flush_batches()
+        self.apply_matrix()
+        color = self.get_color()
+        colors = []
         for pixel in pixels:
-            self.draw_pixel(*pixel)
+            if len(pixel) > 2 and pixel[2]: color = pixel[2]
+            colors.append(color)
+
+        if None in colors or not self._blit_pixels(pixels, colors):
+            self._fill_pixel_runs(pixels, colors)
+        if colors[-1]: self.set_color(colors[-1])
+
+    def _blit_pixels(self, pixels, colors):
+        """ Composite pixels directly into the numpy data of the surface.
+            Returns False if that isn't possible: the transformation is not axis-aligned, pixel edges
+            don't fall on device pixels or pixels overlap, so the order of drawing would matter.
+        """
+        context = self.cairo_context
+        # While drawing onto another target there is no numpy data to write into
+        if self.data is None: return False
+        if context.get_operator() != cairo.OPERATOR_OVER: return False
+        (xx, yx, xy, yy, x0, y0) = self.matrix
+        if xy or yx: return False
+
+        coordinates = numpy.array([pixel[:2] for pixel in pixels], dtype=numpy.float64)
+        left = coordinates[:,0] * (self.pixel_width * xx) + x0
+        top = coordinates[:,1] * (self.pixel_height * yy) + y0
+        block_width = self.pixel_width * xx
+        block_height = self.pixel_height * yy
+        if block_width < 0:
+            left += block_width
+            block_width = -block_width
+        if block_height < 0:
+            top += block_height
+            block_height = -block_height
+        edges = numpy.concatenate((left, top, [block_width, block_height]))
+        if numpy.abs(edges - numpy.round(edges)).max() > 1e-6: return False
+        block_width = int(round(block_width))
+        block_height = int(round(block_height))
+        if not block_width or not block_height: return True
+
+        # Device pixel indices covered by every block, clipped to the surface
+        rows = numpy.round(top).astype(numpy.int64)[:,None,None] + numpy.arange(block_height)[None,:,None]
+        columns = numpy.round(left).astype(numpy.int64)[:,None,None] + numpy.arange(block_width)[None,None,:]
+        (rows, columns) = numpy.broadcast_arrays(rows, columns)
+        visible = (rows >= 0) & (rows < self.height) & (columns >= 0) & (columns < self.width)
+        indices = (rows * self.width + columns)[visible]
+        if len(numpy.unique(indices)) != len(indices): return False
+
+        # Premultiplied source colors, repeated for every device pixel of a block
+        rgba = numpy.clip(numpy.array([(c.r, c.g, c.b, c.a) for c in colors], dtype=numpy.float64), 0, 1)
+        rgba[:,:3] *= rgba[:,3:]
+        block_index = numpy.broadcast_to(numpy.arange(len(pixels))[:,None,None], visible.shape)[visible]
+        source = rgba[block_index] * 255
+        alpha = rgba[block_index,3:]
+
+        # ARGB32 is a native-endian 32 bit value per pixel, so shifts are independent of the byte order
+        self.cairo_surface.flush()
+        surface_pixels = self.data.view(numpy.uint32)
+        destination = surface_pixels[indices]
+        result = numpy.zeros(len(indices), dtype=numpy.uint32)
+        for (channel, shift) in enumerate((16, 8, 0, 24)):
+            value = (destination >> shift) & 0xff
+            value = numpy.round(source[:,channel] + value * (1 - alpha[:,0]))
+            result |= numpy.clip(value, 0, 255).astype(numpy.uint32) << shift
+        surface_pixels[indices] = result
+        self.cairo_surface.mark_dirty()
+        return True
+
+    def _fill_pixel_runs(self, pixels, colors):
+        """ Fill every run of consecutive pixels with the same color as a single path.
+            Translucent runs are split where a pixel repeats, because a single fill would only cover it once.
+        """
+        context = self.cairo_context
+        run_color = colors[0]
+        run_pixels = set()
+        for (pixel, color) in zip(pixels, colors):
+            position = (pixel[0], pixel[1])
+            if color != run_color or (color and color.a < 1 and position in run_pixels):
+                if run_color: self.set_color(run_color)
+                self.apply_color()
+                context.fill()
+                self.fills += 1
+                run_pixels = set()
+            run_color = color
+            run_pixels.add(position)
+            context.rectangle(pixel[0] * self.pixel_width, pixel[1] * self.pixel_height, self.pixel_width, self.pixel_height)
+        if run_color: self.set_color(run_color)
+        self.apply_color()
+        context.fill()
+        self.fills += 1
+        context.new_path()
 
     def draw_polygon(self, coordinates, fill_color = None, stroke_color = None):
-        """ Draw an n-sided polygon """
+        """ Draw an n-sided polygon. Polygons without a stroke turning in only one direction, like convex ones, are filled in batches, see _batch. """
         if len(coordinates) < 3: raise Exception("Polygons need to have at least three points")
+        self.primitives += 1
+        if fill_color and not stroke_color and self._turns_one_way(coordinates):
+            self._batch(fill_color, coordinates)
+            return
+        self.flush_batches()
+        self.apply_matrix()
         self.cairo_context.move_to( coordinates[0][0], coordinates[0][1] )
         for (x,y) in coordinates[1:]:
             self.cairo_context.line_to(x,y)
         self.apply_colors(fill_color, stroke_color)
 
+    def _turns_one_way(self, coordinates):
+        """ Check whether a polygon only turns left or only turns right, so its area never winds the other way """
+        turns = set()
+        count = len(coordinates)
+        for index in range(count):
+            (x0, y0) = coordinates[index - 1]
+            (x1, y1) = coordinates[index]
+            (x2, y2) = coordinates[(index + 1) % count]
+            turn = (x1 - x0) * (y2 - y1) - (y1 - y0) * (x2 - x1)
+            if turn: turns.add(turn > 0)
+        return len(turns) < 2
+
     def draw_text(self, x, y, text, fill_color = None, stroke_color = None):
+        self.primitives += 1
+        self.flush_batches()
+        self.apply_matrix()
         self.cairo_context.move_to(x,y)
         self.cairo_context.text_path(text)
         self.apply_colors(fill_color, stroke_color)
@@ -109,44 +400,82 @@ class Gui(object):
         """ Apply fill and stroke colors to the current path """
         if fill_color:
             self.set_color(fill_color)
+            self.apply_color()
             self.cairo_context.fill_preserve()
+            self.fills += 1
         if stroke_color:
             self.set_color(stroke_color)
+            self.apply_color()
             self.cairo_context.stroke()
+            self.strokes += 1
 
         self.cairo_context.new_path()
 
     def set_color(self, color):
-        self.cairo_context.set_source_rgba(color.r, color.g, color.b, color.a)
+        """ Set the current color, it is set on the cairo context by apply_color """
+        self.color = color
+        self.color_changes += 1
+
+    def get_color(self):
+        """ Returns the current color """
+        return self.color
+
+    def apply_color(self):
+        """ Set the current color as the source of the cairo context, before filling or stroking with it """
+        if self.cairo_color != self.color:
+            color = self.color
+            self.cairo_context.set_source_rgba(color.r, color.g, color.b, color.a)
+            self.cairo_color = color
 
     def rotate(self, angle):
-        """ Rotates the transformation matrix, this only has an effect on 
+        """ Rotates the transformation matrix by angle degrees, this only has an effect on
             newly drawn things and is kind of useless.
         """
-        self.cairo_context.rotate(self.from_degrees(angle))
+        radians = self.from_degrees(angle)
+        (c, s) = (math.cos(radians), math.sin(radians))
+        (xx, yx, xy, yy, x0, y0) = self.matrix
+        self.matrix = (xx * c + xy * s, yx * c + yy * s, xy * c - xx * s, yy * c - yx * s, x0, y0)
 
     def reverse_rotate(self, angle):
-        self.rotate(self.from_degrees(-angle))
+        self.rotate(-angle)
 
     def scale(self, amount=1):
-        self.cairo_context.scale(amount, amount)
+        (xx, yx, xy, yy, x0, y0) = self.matrix
+        self.matrix = (xx * amount, yx * amount, xy * amount, yy * amount, x0, y0)
 
     def reverse_scale(self, amount=1):
         self.scale(1.0 / amount)
 
     def translate(self, x, y):
-        self.cairo_context.translate(x, y)
+        (xx, yx, xy, yy, x0, y0) = self.matrix
+        self.matrix = (xx, yx, xy, yy, xx * x + xy * y + x0, yx * x + yy * y + y0)
 
     def reverse_translate(self, x, y):
         self.translate(-x, -y)
 
     def transform(self, translate_x = 0, translate_y = 0, scale = 1):
-        self.translate(translate_x, translate_y)
-        self.scale(scale)
+        """ Translate and then scale, the transformation of sub-commands """
+        (xx, yx, xy, yy, x0, y0) = self.matrix
+        self.matrix = (xx * scale, yx * scale, xy * scale, yy * scale,
+            xx * translate_x + xy * translate_y + x0, yx * translate_x + yy * translate_y + y0)
 
     def reverse_transform(self, translate_x = 0, translate_y = 0, scale = 1):
-        self.cairo_context.scale(1.0 / scale, 1.0 / scale)
-        self.cairo_context.translate(translate_x * -1, translate_y * -1)
+        self.scale(1.0 / scale)
+        self.translate(-translate_x, -translate_y)
+
+    def get_matrix(self):
+        """ Returns the current transformation matrix, see IDENTITY """
+        return self.matrix
+
+    def set_matrix(self, matrix):
+        """ Set the current transformation matrix, a tuple like IDENTITY or a cairo.Matrix """
+        self.matrix = matrix if type(matrix) == tuple else tuple(matrix)
+
+    def apply_matrix(self):
+        """ Set the current transformation matrix on the cairo context, before drawing with it """
+        if self.cairo_matrix is not self.matrix:
+            self.cairo_context.set_matrix(cairo.Matrix(*self.matrix))
+            self.cairo_matrix = self.matrix
 
     def from_degrees(self, degrees):
         return degrees * math.pi / 180.0
@@ -166,17 +495,54 @@ class Gui(object):
         self.cairo_context.set_source_rgba(0, 1, 0, 0.5)
         self.cairo_context.stroke()
 
-    def _bgra_surf_to_rgba_string(self):
-        img = Image.frombuffer(
-            'RGBA', (self.cairo_surface.get_width(),
-                     self.cairo_surface.get_height()),
-            self.cairo_surface.get_data(), 'raw', 'BGRA', 0, 1)
-     
-        return img.tostring('raw', 'RGBA', 0, 1)
+    def write_to_png(self, filename):
+        self.flush()
+        self.cairo_surface.write_to_png(filename)
 
-    def update(self):
-        data_string = self._bgra_surf_to_rgba_string()
-        pygame_surface = pygame.image.frombuffer(data_string, (self.width, self.height), 'RGBA')
+class Gui(Canvas):
+    def __init__(self, width = 640, height = 480, caption = "DisplayTest", textureDirectory = "textures", virtual_width = None, virtual_height = None):
+        """ Initialize a pygame window showing a canvas. This is only for early testing, there probably won't be a gui later. """
+        if pygame is None: raise Exception("pygame is required to open a window, use Canvas for headless rendering")
+        pygame.init()
+        screen = pygame.display.set_mode((width,height))
+        pygame.display.set_caption(caption)
+        
+        background = pygame.Surface(screen.get_size())
+        background.fill((255, 255, 255))
+        
+        screen.blit(background, (0, 0))
+        pygame.display.flip()
 
-        self.screen.blit(pygame_surface, (0,0)) 
+        Canvas.__init__(self, width, height, textureDirectory, virtual_width, virtual_height)
+
+        self.screen = screen
+        self.clock = pygame.time.Clock()
+        self._create_pygame_surface()
+
+    def _create_pygame_surface(self):
+        """ Create the pygame surface that presents the cairo data.
+            On little-endian machines cairo's ARGB32 pixels are BGRA bytes, which newer pygame versions can wrap without copying.
+            Otherwise a surface with cairo's channel masks is used, so presenting a frame is a single copy without any swizzling.
+        """
+        self.shares_data = False
+        if sys.byteorder == 'little':
+            try:
+                self.pygame_surface = pygame.image.frombuffer(self.data, (self.width, self.height), 'BGRA')
+                self.shares_data = True
+                return
+            except ValueError:
+                pass
+        masks = (0x00ff0000, 0x0000ff00, 0x000000ff, 0xff000000)
+        self.pygame_surface = pygame.Surface((self.width, self.height), pygame.SRCALPHA, 32, masks)
+
+    def update(self):
+        """ Show the current state of the canvas in the window """
+        self.flush()
+        if not self.shares_data:
+            # surfarray is indexed by x first, so the transposed view of the cairo pixels matches it
+            pixels = pygame.surfarray.pixels2d(self.pygame_surface)
+            pixels[...] = self.data.view(numpy.uint32).reshape(self.height, self.width).T
+            del pixels
+
+        self.screen.blit(self.pygame_surface, (0,0)) 
         pygame.display.flip()
\ No newline at end of file
@@ -0,0 +1,129 @@
+# Places many instances of a command at once, with transformations generated by numpy
+
+import numpy
+import rng
+from executor import OP_CALL
+
+def value_interval(value):
+    """ Values are numbers or (from, to) tuples of random ranges """
+    if type(value) == tuple: return (min(value), max(value))
+    return (value, value)
+
+class Instances(object):
+    """ Base class of instancing sub-commands. Every instance is a call of callee with a (translate_x, translate_y, scale)
+        transformation, like a sub-command. Subclasses generate the transformations of all instances at once.
+        jitter moves every instance by a random offset of up to (x, y).
+        Random values of all instances are drawn at once, as numpy arrays from the stream of the instancing op.
+    """
+    def __init__(self, callee, count, scale = 1, jitter = (0, 0)):
+        self.callee = callee
+        self.count = int(count)
+        self.scale = scale
+        self.jitter = jitter
+        self.random = type(scale) == tuple or any(jitter)
+        # Set by the parser, the position of the op in the calling program
+        self.site = 0
+        # Instances without random values are the same every time, so their calls are only created once
+        self.static_calls = None
+
+    def calls(self, key):
+        """ Returns the call ops of all instances, random values are drawn from the stream of key """
+        if self.static_calls is not None: return self.static_calls
+        generator = rng.ArrayStream(key) if self.random else None
+        transforms = self.transforms(generator)
+        if any(self.jitter):
+            transforms[:,0] += generator.uniform(-self.jitter[0], self.jitter[0], self.count)
+            transforms[:,1] += generator.uniform(-self.jitter[1], self.jitter[1], self.count)
+        sites = self.sites()
+        calls = [(OP_CALL, self.callee, transform, {}, (), None, sites[index], False) for (index, transform) in enumerate(transforms.tolist())]
+        if not self.random: self.static_calls = calls
+        return calls
+
+    def sites(self):
+        """ Sites of the calls of all instances, they never collide with the sites of ops, which are positions in the program """
+        first_site = (self.site + 1) << 32
+        return range(first_site, first_site + self.count)
+
+    def values(self, generator, value):
+        """ An array with a value for every instance, random ranges are drawn for every instance """
+        if type(value) == tuple: return generator.uniform(value[0], value[1], self.count)
+        return numpy.repeat(float(value), self.count)
+
+    def transforms(self, generator):
+        """ Returns an array with a (translate_x, translate_y, scale) row for every instance """
+        raise NotImplementedError()
+
+    def intervals(self):
+        """ Returns the (low, high) intervals of translate_x, translate_y and scale of all instances, for bounds """
+        (x, y, scale) = self.position_intervals()
+        return ((x[0] - abs(self.jitter[0]), x[1] + abs(self.jitter[0])), (y[0] - abs(self.jitter[1]), y[1] + abs(self.jitter[1])), scale)
+
+    def position_intervals(self):
+        raise NotImplementedError()
+
+class Grid(Instances):
+    """ count = [columns, rows] instances, spacing apart, starting at origin """
+    def __init__(self, callee, count, spacing, origin = (0, 0), scale = 1, jitter = (0, 0)):
+        (self.columns, self.rows) = [int(value) for value in count]
+        Instances.__init__(self, callee, self.columns * self.rows, scale, jitter)
+        self.spacing = spacing
+        self.origin = origin
+
+    def transforms(self, generator):
+        index = numpy.arange(self.count)
+        transforms = numpy.empty( (self.count, 3) )
+        transforms[:,0] = self.origin[0] + (index % self.columns) * self.spacing[0]
+        transforms[:,1] = self.origin[1] + (index // self.columns) * self.spacing[1]
+        transforms[:,2] = self.values(generator, self.scale)
+        return transforms
+
+    def position_intervals(self):
+        xs = [self.origin[0], self.origin[0] + max(self.columns - 1, 0) * self.spacing[0]]
+        ys = [self.origin[1], self.origin[1] + max(self.rows - 1, 0) * self.spacing[1]]
+        return ((min(xs), max(xs)), (min(ys), max(ys)), value_interval(self.scale))
+
+class Scatter(Instances):
+    """ count instances at random positions within area = [left, top, width, height] """
+    def __init__(self, callee, count, area, scale = 1, jitter = (0, 0)):
+        Instances.__init__(self, callee, count, scale, jitter)
+        self.area = area
+        self.random = True
+
+    def transforms(self, generator):
+        (left, top, width, height) = self.area
+        transforms = numpy.empty( (self.count, 3) )
+        transforms[:,0] = generator.uniform(left, left + width, self.count)
+        transforms[:,1] = generator.uniform(top, top + height, self.count)
+        transforms[:,2] = self.values(generator, self.scale)
+        return transforms
+
+    def position_intervals(self):
+        (left, top, width, height) = self.area
+        return ((min(left, left + width), max(left, left + width)), (min(top, top + height), max(top, top + height)), value_interval(self.scale))
+
+class Repeat(Instances):
+    """ count instances in a row, every one moved by step = [x, y] and scaled by scale_step relative to the one before """
+    def __init__(self, callee, count, step, origin = (0, 0), scale = 1, scale_step = 1, jitter = (0, 0)):
+        Instances.__init__(self, callee, count, scale, jitter)
+        self.step = step
+        self.origin = origin
+        self.scale_step = scale_step
+
+    def transforms(self, generator):
+        index = numpy.arange(self.count)
+        transforms = numpy.empty( (self.count, 3) )
+        transforms[:,0] = self.origin[0] + index * self.step[0]
+        transforms[:,1] = self.origin[1] + index * self.step[1]
+        transforms[:,2] = self.values(generator, self.scale) * float(self.scale_step) ** index
+        return transforms
+
+    def position_intervals(self):
+        last = max(self.count - 1, 0)
+        xs = [self.origin[0], self.origin[0] + last * self.step[0]]
+        ys = [self.origin[1], self.origin[1] + last * self.step[1]]
+        factors = [1, float(self.scale_step) ** last]
+        (low, high) = value_interval(self.scale)
+        scales = [low * min(factors), low * max(factors), high * min(factors), high * max(factors)]
+        return ((min(xs), max(xs)), (min(ys), max(ys)), (min(scales), max(scales)))
+
+INSTANCES = {'grid':Grid, 'scatter':Scatter, 'repeat':Repeat}
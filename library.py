@@ -0,0 +1,45 @@
+# Indexes the definitions of a directory of yaml files, so commands can be parsed only when they are needed
+
+import os
+import yaml
+import store
+
+class Library(object):
+    """ Where the top-level definitions in the yaml files of a directory and its sub-directories are, by command name.
+        Only the (filename, start, end) offsets of definitions are kept, their texts are read when they are needed.
+        Files are only split into definitions, not parsed, see store.definition_spans. Files that can't be split,
+        for example because of anchors and aliases, are parsed once to find their names, the text of each of
+        their definitions is then the whole file.
+    """
+    def __init__(self, directory):
+        self.directory = directory
+        self.definitions = {}
+        for (path, directories, filenames) in os.walk(directory):
+            directories.sort()
+            for filename in sorted(filenames):
+                if os.path.splitext(filename)[1] in ('.yaml', '.yml'):
+                    self.index(os.path.join(path, filename))
+
+    def index(self, filename):
+        # Binary mode, so offsets are the same when the text is read again
+        text = open(filename, 'rb').read()
+        spans = store.definition_spans(text)
+        if spans is None:
+            data = yaml.safe_load(text) or []
+            if not type(data) == list: raise Exception("Root level of data must be a list, not a %s in %s" % (type(data), filename))
+            spans = [(name, 0, len(text)) for definition in data for name in definition]
+        for (name, start, end) in spans:
+            if name in self.definitions:
+                raise Exception("Command %s is defined in %s and %s" % (name, self.definitions[name][0], filename))
+            self.definitions[name] = (filename, start, end)
+
+    def __contains__(self, name):
+        return name in self.definitions
+
+    def text(self, name):
+        """ The yaml text defining a command """
+        if name not in self.definitions: raise Exception("Unknown command %s in library %s" % (name, self.directory))
+        (filename, start, end) = self.definitions[name]
+        with open(filename, 'rb') as f:
+            f.seek(start)
+            return f.read(end - start)
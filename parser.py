@@ -1,15 +1,133 @@
 # Parses drawing commands
 
+import os
 import yaml
 import gui
 import re
-import random
-from copy import copy
-from functools import partial
+import operator
+import executor
+import cache
+import bounds
+import store
+import profiler
+import instancing
+import library
+from executor import ARG_CONST, ARG_RANDOM, ARG_VARIABLE, ARG_COLOR, ARG_LIST, ARG_UPDATE
 
 TRANSFORMATIONS = {'scale':'scale', 'translate':'translate', 'rotate':'rotate'}
-REVERSE_TRANSFORMATIONS = {'scale':'reverse_scale', 'translate':'reverse_translate', 'rotate':'reverse_rotate'}
 PRIMITIVES = {'rect':'draw_rect', 'polygon':'draw_polygon', 'pixel':'draw_pixel', 'pixels':'draw_pixels', 'text':'draw_text'}
+UPDATE_OPERATORS = {'*':operator.mul, '/':operator.truediv, '-':operator.sub, '+':operator.add}
+# Version of the data produced by Command.to_data, cached definitions of other versions are parsed again
+DATA_VERSION = 1
+
+# Definitions are plain data, so the safe loader is enough. The C implementation is a lot faster, if it is available.
+try:
+    Loader = yaml.CSafeLoader
+except AttributeError:
+    Loader = yaml.SafeLoader
+
+class RandomValue(object):
+    """ A random argument in the form of rand(from, to), a new value is drawn every time it is used """
+    def __init__(self, rand_from, rand_to):
+        self.rand_from = rand_from
+        self.rand_to = rand_to
+
+    def __repr__(self):
+        return 'rand(%s,%s)' % (self.rand_from, self.rand_to)
+
+class VariableReference(object):
+    """ A reference to a variable of the command the argument belongs to """
+    def __init__(self, name):
+        self.name = name
+
+    def __repr__(self):
+        return self.name
+
+class ColorValue(object):
+    """ A color definition in the form of c(r,g,b[,a]), each component can be any other argument """
+    def __init__(self, r, g, b, a = 1):
+        self.components = [r, g, b, a]
+
+    def __repr__(self):
+        return 'c(%s,%s,%s,%s)' % tuple(self.components)
+
+class ValueUpdate(object):
+    """ A relative update of a variable in the form of *=, /=, -= or +=, used in recursion vars """
+    def __init__(self, operator, operand):
+        self.operator = operator
+        self.operand = operand
+
+    def __repr__(self):
+        return '%s=%s' % (self.operator, self.operand)
+
+def encode_arg(arg):
+    """ Convert a parsed argument into json compatible data """
+    if isinstance(arg, RandomValue): return {'$rand':[arg.rand_from, arg.rand_to]}
+    if isinstance(arg, VariableReference): return {'$var':arg.name}
+    if isinstance(arg, ColorValue): return {'$color':[encode_arg(component) for component in arg.components]}
+    if isinstance(arg, ValueUpdate): return {'$update':[arg.operator, encode_arg(arg.operand)]}
+    if type(arg) == list: return [encode_arg(item) for item in arg]
+    if type(arg) == dict: return {'$dict':dict((key, encode_arg(value)) for (key, value) in arg.items())}
+    return arg
+
+def decode_arg(data):
+    """ Convert data created by encode_arg back into a parsed argument """
+    if type(data) == list: return [decode_arg(item) for item in data]
+    if type(data) != dict: return data
+    (tag, value) = data.items()[0]
+    if tag == '$rand': return RandomValue(*value)
+    if tag == '$var': return VariableReference(value)
+    if tag == '$color': return ColorValue(*[decode_arg(component) for component in value])
+    if tag == '$update': return ValueUpdate(value[0], decode_arg(value[1]))
+    return dict((key, decode_arg(item)) for (key, item) in value.items())
+
+def compile_arg(arg, variable_index, random_ranges):
+    """ Convert a parsed argument into an argument slot for the executor, variable_index maps variable names to their index.
+        The ranges of random values are appended to the program's random_ranges, their slots refer to their position.
+        Lists and colors that only contain constants are folded into constants.
+    """
+    if isinstance(arg, RandomValue):
+        random_ranges.append( (arg.rand_from, arg.rand_to) )
+        return (ARG_RANDOM, (arg.rand_from, arg.rand_to, len(random_ranges) - 1))
+    if isinstance(arg, VariableReference): return (ARG_VARIABLE, variable_index[arg.name])
+    if isinstance(arg, ValueUpdate): return (ARG_UPDATE, (UPDATE_OPERATORS[arg.operator], compile_arg(arg.operand, variable_index, random_ranges)))
+    if isinstance(arg, ColorValue):
+        components = [compile_arg(component, variable_index, random_ranges) for component in arg.components]
+        if all(slot[0] == ARG_CONST for slot in components):
+            return (ARG_CONST, gui.Color(*[slot[1] for slot in components]))
+        return (ARG_COLOR, components)
+    if type(arg) == list:
+        items = [compile_arg(item, variable_index, random_ranges) for item in arg]
+        if all(slot[0] == ARG_CONST for slot in items):
+            return (ARG_CONST, [slot[1] for slot in items])
+        return (ARG_LIST, items)
+    return (ARG_CONST, arg)
+
+def compile_args(args, kwargs, variable_index, random_ranges):
+    """ Compile args and kwargs. Returns (args, kwargs, dynamic), if dynamic is False args and kwargs contain plain values. """
+    args = [compile_arg(arg, variable_index, random_ranges) for arg in args]
+    kwargs = dict((name, compile_arg(value, variable_index, random_ranges)) for (name, value) in kwargs.items())
+    dynamic = any(slot[0] != ARG_CONST for slot in args + list(kwargs.values()))
+    if not dynamic:
+        args = [slot[1] for slot in args]
+        kwargs = dict((name, slot[1]) for (name, slot) in kwargs.items())
+    return (args, kwargs, dynamic)
+
+def instancing_arg(value):
+    """ Arguments of instancing sub-commands are numbers, lists of them or random ranges, which become (from, to) tuples """
+    if isinstance(value, RandomValue): return (value.rand_from, value.rand_to)
+    if type(value) == list: return [instancing_arg(item) for item in value]
+    if type(value) in [int, float]: return value
+    raise Exception("Instancing arguments have to be numbers or random values, not %s" % value)
+
+def uses_current_color(name, args, kwargs):
+    """ Pixels without a color are drawn with whatever color was set before """
+    if name == 'pixel':
+        return len(args) < 3 and not kwargs.get('color')
+    if name == 'pixels':
+        pixels = args[0] if args else kwargs.get('pixels')
+        return bool(pixels) and type(pixels[0]) == list and len(pixels[0]) < 3
+    return False
 
 class Command(object):
     """ A Command object defines the highest level of commands, its subcommands are simple dictionaries, 
@@ -17,9 +135,7 @@ class Command(object):
     def __init__(self, name):
         self.name = name 
         self.sub_commands = []
-        self.recursion_depth = 0
         self.variables = {}
-        self.vars_to_replace = {}
 
     def add_subcommand(self, command_name, command_args, command_kwargs):
         self.sub_commands.append( {'name':command_name, 'args':command_args, 'kwargs':command_kwargs} ) 
@@ -27,31 +143,41 @@ class Command(object):
     def __repr__(self):
         return "Command %s: %s" % (self.name, self.sub_commands)
 
-    def variable_resolver(self, var_name):
-        if var_name in self.vars_to_replace: return self.vars_to_replace[var_name]
-        return self.variables[var_name]
-
-    def eval_partial(self, arg):
-        """ Evaluates arg if it is callable, simply returns it if it is not. """
-        if callable(arg): return arg()
-        return arg
-
-    def create_color(self, *args):
-        args = list(args)
-        arg_index = 0
-        for arg in args:
-            while callable(arg): 
-                arg = arg()
-                args[arg_index] = arg
-
-            arg_index += 1
-        return gui.Color(*args)
+    def references(self):
+        """ Names of the commands the command uses as sub-commands or instances """
+        names = []
+        for sub_command in self.sub_commands:
+            name = sub_command['name']
+            if name in instancing.INSTANCES:
+                if 'command' in sub_command['kwargs']: names.append(sub_command['kwargs']['command'])
+            elif name not in PRIMITIVES and name not in TRANSFORMATIONS:
+                names.append(name)
+        return names
+
+    def to_data(self):
+        """ Returns the parsed command as json compatible data """
+        sub_commands = []
+        for sub_command in self.sub_commands:
+            kwargs = dict((name, encode_arg(value)) for (name, value) in sub_command['kwargs'].items())
+            sub_commands.append( [sub_command['name'], encode_arg(sub_command['args']), kwargs] )
+        variables = dict((name, encode_arg(value)) for (name, value) in self.variables.items())
+        return {'name':self.name, 'sub_commands':sub_commands, 'variables':variables}
+
+    @classmethod
+    def from_data(cls, data):
+        """ Create a parsed command from data returned by to_data """
+        command = cls(data['name'])
+        for (name, args, kwargs) in data['sub_commands']:
+            kwargs = dict((arg_name, decode_arg(value)) for (arg_name, value) in kwargs.items())
+            command.add_subcommand(name, decode_arg(args), kwargs)
+        command.variables = dict((name, decode_arg(value)) for (name, value) in data['variables'].items())
+        return command
 
     def parse_args(self, arg):
         """ Parse command arguments, converting special types of arguments:
-            Color definitions in the form of 'c(r,g,b[,a])' are converted into gui.Color objects
+            Color definitions in the form of 'c(r,g,b[,a])' are converted into ColorValue objects
             Random values in the form of rand(from, to) or rand(to):
-                These are converted to partial function objects containing random.uniform(from,to)
+                These are converted to RandomValue objects, the executor draws a new value in [from, to) for them
                 The reason for this is that the random numbers need to be regenerated every time the command is used.
                 If they weren't recreated, every object would have the same random values and all copies would look the same.
         """
@@ -70,10 +196,8 @@ class Command(object):
         m = re.match(r'^(\w+) ?= ?(.+)$', arg)
         if m:
             var_name = m.groups()[0]
-            value = partial(self.variable_resolver, *[self.parse_args(m.groups()[0])])
             self.variables[var_name] = self.parse_args(m.groups()[1])
-            self.vars_to_replace[var_name] = self.parse_args(m.groups()[1])
-            return value
+            return VariableReference(var_name)
 
         # String-encoded numbers
         m = re.match(r'^-?\d*\.?\d+$', arg)
@@ -83,19 +207,19 @@ class Command(object):
         # Value multiplication
         m = re.match(r'^ *\*= *(.+)$', arg)
         if m:
-            return lambda x: x * self.eval_partial(self.parse_args(m.groups()[0]))
+            return ValueUpdate('*', self.parse_args(m.groups()[0]))
         # Value division
         m = re.match(r'^ *\/= *(.+)$', arg)
         if m:
-            return lambda x: float(x) / self.eval_partial(self.parse_args(m.groups()[0]))
+            return ValueUpdate('/', self.parse_args(m.groups()[0]))
         # Value substraction
         m = re.match(r'^ *\-= *(.+)$', arg)
         if m:
-            return lambda x: x - self.eval_partial(self.parse_args(m.groups()[0]))
+            return ValueUpdate('-', self.parse_args(m.groups()[0]))
         # Value addition
         m = re.match(r'^ *\+= *(.+)$', arg)
         if m:
-            return lambda x: x + self.eval_partial(self.parse_args(m.groups()[0]))
+            return ValueUpdate('+', self.parse_args(m.groups()[0]))
 
         # Random values
         m = re.match(r'^rand\((-?\d*\.?\d+)(?: *, *(-?\d*\.?\d+))?\)', arg)
@@ -106,7 +230,7 @@ class Command(object):
             else:
                 rand_from = 0
                 rand_to = float(m.groups()[0])
-            return partial(random.uniform, *[rand_from, rand_to])
+            return RandomValue(rand_from, rand_to)
 
         # Colors
         m = re.match(r'^c\(([^,]+),([^,]+),([^,]+)(?:,([^,]+))?\)$', arg)
@@ -118,18 +242,125 @@ class Command(object):
                 a = self.parse_args(m.groups()[3])
             else:
                 a = 1
-            return partial(self.create_color, r, g, b, a)
+            return ColorValue(r, g, b, a)
         return arg
 
+    def compile_variables(self, program):
+        """ Give every variable of the command an index and compile their default values """
+        names = sorted(self.variables)
+        variable_index = dict((name, index) for (index, name) in enumerate(names))
+        program.random_ranges = []
+        program.set_variables(names, [compile_arg(self.variables[name], variable_index, program.random_ranges) for name in names])
+
+    def compile(self, program, programs, gui):
+        """ Compile the sub commands into the flat op list of program, after compile_variables was called for all programs.
+            programs maps command names to their programs, drawing functions are bound to gui.
+        """
+        variable_index = program.variable_index
+        random_ranges = program.random_ranges
+        for sub_command in self.sub_commands:
+            name = sub_command['name']
+            if name in PRIMITIVES:
+                (args, kwargs, dynamic) = compile_args(sub_command['args'], sub_command['kwargs'], variable_index, random_ranges)
+                program.ops.append( (executor.OP_DRAW, getattr(gui, PRIMITIVES[name]), args, kwargs, dynamic) )
+                if uses_current_color(name, sub_command['args'], sub_command['kwargs']):
+                    program.uses_current_color = True
+
+            elif name in TRANSFORMATIONS:
+                (args, kwargs, dynamic) = compile_args(sub_command['args'], sub_command['kwargs'], variable_index, random_ranges)
+                program.ops.append( (executor.OP_TRANSFORM, getattr(gui, TRANSFORMATIONS[name]), args, kwargs, dynamic) )
+
+            elif name in instancing.INSTANCES:
+                # Instancing sub-commands call a command many times, with the transformations of all instances generated at once
+                kwargs = dict(sub_command['kwargs'])
+                callee_name = kwargs.pop('command', None)
+                if callee_name not in programs: raise Exception("Unknown command %s in %s" % (callee_name, name))
+                kwargs = dict((str(arg_name), instancing_arg(value)) for (arg_name, value) in kwargs.items())
+                instances = instancing.INSTANCES[name](programs[callee_name], **kwargs)
+                # The position of an op in the program is its site
+                instances.site = len(program.ops)
+                program.ops.append( (executor.OP_INSTANCES, programs[callee_name], instances, instances.site, instances.random) )
+
+            elif name in programs:
+                # Sub-commands always have the same arguments: translate-x, translate-y and scale
+                # Variables of the sub-command can be replaced with vars, recursion can be limited with stop_recursion
+                kwargs = dict(sub_command['kwargs'])
+                callee_index = programs[name].variable_index
+                var_updates = []
+                for (var_name, value) in kwargs.pop('vars', {}).items():
+                    if var_name not in callee_index: raise Exception("Unknown variable %s of command %s in vars of %s" % (var_name, name, self.name))
+                    var_updates.append( (callee_index[var_name], compile_arg(value, variable_index, random_ranges)) )
+                max_depth = kwargs.pop('stop_recursion', {}).get('max_depth')
+                (args, kwargs, dynamic) = compile_args(sub_command['args'], kwargs, variable_index, random_ranges)
+                program.ops.append( (executor.OP_CALL, programs[name], args, kwargs, var_updates, max_depth, len(program.ops), dynamic) )
+
+            else:
+                raise Exception("Illegal sub_command %s" % name)
+
 
 class GagParser(object):
     """ Parses yaml data to create commands"""
     def __init__(self, raw_data, gui):
-        self.data = yaml.load(raw_data)
+        self.data = []
+        if raw_data is not None: self.data = yaml.load(raw_data, Loader = Loader)
         if not type(self.data) == list: raise Exception("Root level of data must be a list, not a %s" % type(self.data))
         self.commands = {}
+        self.programs = {}
+        self.executor = None
+        # An optional library.Library, commands missing from it are parsed when they are executed
+        self.library = None
         self.gui = gui
 
+    @classmethod
+    def from_file(cls, filename, gui, cache_directory = None):
+        """ Create a parser with all parsed and compiled definitions of a yaml file.
+            With a cache_directory, parsed definitions are kept on disk and only changed definitions are parsed again.
+            If filename is a directory, it is indexed as a library.Library instead and commands are only parsed when they are executed.
+        """
+        parser = cls(None, gui)
+        if os.path.isdir(filename):
+            parser.library = library.Library(filename)
+        else:
+            parser.load(filename, cache_directory)
+        parser.compile()
+        return parser
+
+    def load_command(self, command_name):
+        """ Parse a command from the library and all commands it uses, unless they are parsed already """
+        if command_name not in self.commands and command_name not in self.library:
+            raise Exception("Unknown command %s" % command_name)
+        pending = [command_name]
+        while pending:
+            name = pending.pop()
+            # Commands missing from the library are reported by compile
+            if name in self.commands or name not in self.library: continue
+            for definition in yaml.load(self.library.text(name), Loader = Loader):
+                command = self.parse_definition(definition)
+                if command.name not in self.commands:
+                    self.commands[command.name] = command
+                    pending += command.references()
+
+    def load(self, filename, cache_directory = None):
+        """ Parse all definitions of a yaml file, or take them from the cache in cache_directory if they didn't change """
+        def load_text(text):
+            data = yaml.load(text, Loader = Loader)
+            if not type(data) == list: raise Exception("Root level of data must be a list, not a %s in %s" % (type(data), filename))
+            return data
+
+        if cache_directory is None:
+            for definition in load_text(open(filename, 'r').read()):
+                command = self.parse_definition(definition)
+                self.commands[command.name] = command
+            return
+
+        def parse_text(text):
+            return [self.parse_definition(definition).to_data() for definition in load_text(text)]
+
+        parse_cache = store.ParseCache(cache_directory, DATA_VERSION)
+        for data in parse_cache.load(filename, parse_text):
+            command = Command.from_data(data)
+            self.commands[command.name] = command
+
     def _single_key_to_tuple(self, dict):
         """ Converts a single-key dictionary to a (key, value) tuple """
         item_list = dict.items()
@@ -140,139 +371,72 @@ class GagParser(object):
     def parse(self):
         """ Parse the from yaml converted data into commands. """
         for definition in self.data:
-            (command_name, definition) = self._single_key_to_tuple(definition)
-            command = Command(command_name)
-            for sub_command in definition:
-                (sub_command_name, sub_args) = self._single_key_to_tuple(sub_command)
-                args = []
-                kwargs = {}
-                if type(sub_args) == list:
-                    args = [command.parse_args(arg) for arg in sub_args]
-                else:
-                    if 'args' in sub_args: 
-                        args = [command.parse_args(arg) for arg in sub_args['args']]
-                    if 'kwargs' in sub_args:
-                        kwargs = {}
-                        for (arg_name, value) in sub_args['kwargs'].items():
-                            kwargs[arg_name] = command.parse_args(value)
-                command.add_subcommand(sub_command_name, args, kwargs)
-            self.commands[command_name] = command
-
-    def get_draw_funcs(self, command):
-        """ Get the correct drawing functions for command and generate an iterator. 
-            Yields (function, args, kwargs) tuples for drawing functions.
-            Drawing functions can be primitives, transformations or sub-commands
-        """
-        reverse_transformations = []
-        restore_vars = {}
-        for sub_command in command.sub_commands:
-            if sub_command['name'] in PRIMITIVES: 
-                # Draw primitive shapes
-                func_name = PRIMITIVES[sub_command['name']]
-                draw_func = eval('gui.Gui.%s' % func_name)
-                yield (draw_func, sub_command['args'], sub_command['kwargs'])
-
-            elif sub_command['name'] in TRANSFORMATIONS:
-                # Apply transformations
-                func_name = TRANSFORMATIONS[sub_command['name']]
-                reverse_func_name = REVERSE_TRANSFORMATIONS[sub_command['name']]
-                draw_func = eval('gui.Gui.%s' % func_name)
-                reverse_func = eval('gui.Gui.%s' % reverse_func_name)
-
-                # Evaluate arguments, so that random values can be undone exactly as they were applied
-                args, kwargs = self.evaluate_callable_args(sub_command['args'], sub_command['kwargs'])
-
-                for var in command.vars_to_replace:
-                    if var in kwargs:
-                        kwargs[var] = command.vars_to_replace[var]
-                # Remember the applied transformation to undo them after the command is finished
-                reverse_transformations.append( (reverse_func, args, kwargs) )
-                yield(draw_func, args, kwargs)
-
+            command = self.parse_definition(definition)
+            self.commands[command.name] = command
+        self.compile()
+
+    def parse_definition(self, definition):
+        """ Parse a single {command_name: [sub_commands]} definition into a command """
+        (command_name, definition) = self._single_key_to_tuple(definition)
+        command = Command(command_name)
+        for sub_command in definition:
+            (sub_command_name, sub_args) = self._single_key_to_tuple(sub_command)
+            args = []
+            kwargs = {}
+            if type(sub_args) == list:
+                args = [command.parse_args(arg) for arg in sub_args]
             else:
-                # Apply subcommands or raise an Exception if no fitting command can be found
-                if sub_command['name'] in self.commands:
-                    sub_sub_command = self.commands[sub_command['name']]
-
-                    # Sub-commands always have the same arguments: translate-x, translate-y and scale
-                    # These can be used to transform the sub-command
-                    evaluated_args, evaluated_kwargs = self.evaluate_callable_args(sub_command['args'], sub_command['kwargs'])
-
-                    # Check recursion parameters
-                    command.recursion_depth += 1
-                    if sub_command['name'] == command.name:
-                        if 'stop_recursion' in evaluated_kwargs:
-                            if 'max_depth' in evaluated_kwargs['stop_recursion']:
-                                if command.recursion_depth >= evaluated_kwargs['stop_recursion']['max_depth'] -1: 
-                                    command.recursion_depth = 0
-                                    continue
-                            del evaluated_kwargs['stop_recursion']
-                        if 'vars' in evaluated_kwargs:
-                            # Defined variables can be replaced for the next recursion level
-                            # Afterwards though, they need to be restored to their former value
-                            restore_vars = {}
-                            for to_replace, value in evaluated_kwargs['vars'].items():
-                                restore_vars[to_replace] = command.vars_to_replace[to_replace]
-                                if callable(value): 
-                                    try: 
-                                        value = value(command.vars_to_replace[to_replace])
-                                    except:
-                                        value = value()
-                                command.vars_to_replace[to_replace] = value
-                            del evaluated_kwargs['vars']
-
-                    self.gui.transform(*evaluated_args, **evaluated_kwargs)
-
-                    # Descend into the subcommand, recursively applying it
-                    for (draw_func, args, kwargs) in self.get_draw_funcs(sub_sub_command):
-                        for var in command.vars_to_replace:
-                            if var in kwargs:
-                                kwargs[var] = command.vars_to_replace[var]
-                        yield (draw_func, args, kwargs)
-
-                    # Revert the subcommand transformation
-                    self.gui.reverse_transform(*evaluated_args)
-
-                    # Revert variable assignments
-                    for to_restore in restore_vars:
-                        command.vars_to_replace[to_restore] = restore_vars[to_restore]
-                else:    
-                    raise Exception("Illegal sub_command")
-        # Reset recursive variable definitions
-        command.vars_to_replace = copy(command.variables)
-
-        # Reverse all applied transformations
-        reverse_transformations.reverse()
-        for (func, args, kwargs) in reverse_transformations:
-            func(self.gui, *args, **kwargs)
-
-
-    def evaluate_callable_args(self, args, kwargs):
-        """ For arguments that are callable, evaluate them and replace them with the return value.
-            This is mostly used for random values which are packed into partial function objects,
-            so that new random numbers can be generated with every use of a command
+                if 'args' in sub_args: 
+                    args = [command.parse_args(arg) for arg in sub_args['args']]
+                if 'kwargs' in sub_args:
+                    kwargs = {}
+                    for (arg_name, value) in sub_args['kwargs'].items():
+                        kwargs[arg_name] = command.parse_args(value)
+            command.add_subcommand(sub_command_name, args, kwargs)
+        return command
+
+    def compile(self):
+        """ Compile the parsed commands into flat programs, which are run by the executor.
+            Commands compiled before are kept, so commands parsed later on can be added.
         """
-        args = copy(args)
-        kwargs = copy(kwargs)
-        arg_index = 0
-        for arg in args:
-            if type(arg) == list:
-                args[arg_index] = self.evaluate_callable_args(arg, {})[0]
-            # Apply partials, mostly to get unique random values for every object
-            if callable(arg): 
-                args[arg_index] = arg()
-            arg_index += 1
-        for (arg, value) in kwargs.items():
-            if callable(value): kwargs[arg] = value()
-        return (args, kwargs)
-
-    def execute(self, command_name):
-        """ Execute a command. """
-        command = self.commands[command_name]
-        for (func, args, kwargs) in self.get_draw_funcs(command):
-            (evaluated_args, evaluated_kwargs) = self.evaluate_callable_args(args, kwargs)
-            try: func(self.gui, *evaluated_args, **evaluated_kwargs)
-            except Exception, e:
-                print e
-                import pdb
-                pdb.set_trace()
+        new_commands = [command for command in self.commands.values() if command.name not in self.programs]
+        # Programs are only added once all of them compiled, half compiled programs must never be run
+        programs = dict(self.programs)
+        try:
+            for command in new_commands:
+                programs[command.name] = executor.Program(command.name)
+            for command in new_commands:
+                command.compile_variables(programs[command.name])
+            for command in new_commands:
+                command.compile(programs[command.name], programs, self.gui)
+        except:
+            # They are parsed again the next time they are needed
+            for command in new_commands:
+                del self.commands[command.name]
+            raise
+        self.programs = programs
+        executor.mark_deterministic(self.programs.values())
+        executor.mark_random(self.programs.values())
+        executor.mark_color(self.programs.values())
+        bounds.calculate_bounds(self.programs.values(), self.gui)
+        if self.executor is None: self.executor = executor.Executor(self.gui)
+
+    def enable_cache(self, max_bytes = 64 * 1024 * 1024):
+        """ Draw deterministic sub-commands from a cache of rasterized copies instead of running them every time """
+        self.executor.cache = cache.RasterCache(max_bytes)
+        return self.executor.cache
+
+    def enable_profiling(self):
+        """ Collect statistics of every command that is run, returns the profiler.Profiler holding them """
+        self.executor.profiler = profiler.Profiler(self.gui)
+        return self.executor.profiler
+
+    def disable_profiling(self):
+        self.executor.profiler = None
+
+    def execute(self, command_name, seed = None):
+        """ Execute a command. With the same seed, a command draws exactly the same thing every time. """
+        if command_name not in self.programs and self.library is not None:
+            self.load_command(command_name)
+            self.compile()
+        self.executor.run(self.programs[command_name], seed)
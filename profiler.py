@@ -0,0 +1,80 @@
+# Measures where the time of a frame goes, per command
+
+import time
+
+class CommandStats(object):
+    """ Totals of all runs of a command, including everything its sub-commands draw """
+    def __init__(self, name):
+        self.name = name
+        self.calls = 0
+        self.time = 0.0
+        self.primitives = 0
+        self.fills = 0
+        self.strokes = 0
+        self.max_depth = 0
+
+    def to_dict(self):
+        return {'calls':self.calls, 'time':self.time, 'primitives':self.primitives,
+            'fills':self.fills, 'strokes':self.strokes, 'max_depth':self.max_depth}
+
+class Profiler(object):
+    """ Collects statistics of commands run by an executor, see GagParser.enable_profiling.
+        The executor calls enter() whenever it starts running a program and leave() once it is finished.
+        Nested runs of the same command, like recursion, are only counted once, as part of the outermost run.
+        Shapes batched by the gui are filled whenever a run starts or finishes, so their fills count for the command
+        that drew them. Profiled frames are filled in more, smaller batches than unprofiled ones.
+    """
+    def __init__(self, gui):
+        self.gui = gui
+        self.stats = {}
+        # Programs currently being run with the time and gui statistics at their start
+        self.active = []
+        self.running = {}
+        self.max_stack_depth = 0
+
+    def reset(self):
+        self.stats = {}
+        self.active = []
+        self.running = {}
+        self.max_stack_depth = 0
+
+    def enter(self, program, depth):
+        """ Called before the ops of program are run, depth is its recursion depth """
+        stats = self.stats.get(program.name)
+        if stats is None:
+            stats = self.stats[program.name] = CommandStats(program.name)
+        stats.calls += 1
+        if depth > stats.max_depth: stats.max_depth = depth
+        gui = self.gui
+        gui.flush_batches()
+        self.active.append( (program.name, time.time(), gui.primitives, gui.fills, gui.strokes) )
+        self.running[program.name] = self.running.get(program.name, 0) + 1
+        if len(self.active) > self.max_stack_depth: self.max_stack_depth = len(self.active)
+
+    def leave(self, program):
+        (name, start, primitives, fills, strokes) = self.active.pop()
+        self.running[name] -= 1
+        if self.running[name]: return
+        gui = self.gui
+        gui.flush_batches()
+        stats = self.stats[name]
+        stats.time += time.time() - start
+        stats.primitives += gui.primitives - primitives
+        stats.fills += gui.fills - fills
+        stats.strokes += gui.strokes - strokes
+
+    def report(self):
+        """ Returns the statistics as a dictionary of command names to dictionaries of
+            calls, time in seconds, primitives, fills, strokes and max_depth, the deepest recursion of the command.
+        """
+        return {'commands':dict((name, stats.to_dict()) for (name, stats) in self.stats.items()),
+            'max_stack_depth':self.max_stack_depth}
+
+    def format_report(self):
+        """ The report as a table, the most expensive commands first """
+        lines = ["%-24s %8s %10s %10s %8s %8s %6s" % ('command', 'calls', 'time (ms)', 'primitives', 'fills', 'strokes', 'depth')]
+        for stats in sorted(self.stats.values(), key = lambda stats: -stats.time):
+            lines.append("%-24s %8d %10.1f %10d %8d %8d %6d" % (stats.name, stats.calls, stats.time * 1000,
+                stats.primitives, stats.fills, stats.strokes, stats.max_depth))
+        lines.append("Maximum stack depth: %s" % self.max_stack_depth)
+        return "\n".join(lines)
@@ -0,0 +1,93 @@
+# Records a single run of a command, to replay it at any size or export it as vector graphics
+
+import argparse
+import math
+import cairo
+import gui
+from parser import GagParser
+
+class Recording(object):
+    """ The drawing operations of one run of a command on a canvas of width x height, kept in a cairo recording surface.
+        Replaying them draws exactly the same picture, including every random value, without running the command again.
+        Replays are scaled as vector graphics, so they are sharp at any size.
+    """
+    def __init__(self, surface, width, height):
+        self.surface = surface
+        self.width = width
+        self.height = height
+
+    @classmethod
+    def record(cls, parser, command_name, transparent = False, seed = None):
+        """ Run a command of a parser once with seed and record everything it draws on the parser's canvas """
+        canvas = parser.gui
+        surface = cairo.RecordingSurface(cairo.CONTENT_COLOR_ALPHA, cairo.Rectangle(0, 0, canvas.width, canvas.height))
+        # Rasterized copies from the cache would be blurry when the recording is scaled up
+        executor_cache = parser.executor.cache
+        parser.executor.cache = None
+        canvas.push_target(surface)
+        try:
+            if not transparent: canvas.fill(gui.Color())
+            parser.execute(command_name, seed)
+        finally:
+            canvas.pop_target()
+            parser.executor.cache = executor_cache
+        return cls(surface, canvas.width, canvas.height)
+
+    def size(self, scale):
+        return (int(math.ceil(self.width * scale)), int(math.ceil(self.height * scale)))
+
+    def replay(self, surface, scale = 1):
+        """ Draw the recording onto another cairo surface, scaled by scale """
+        context = cairo.Context(surface)
+        context.scale(scale, scale)
+        context.set_source_surface(self.surface)
+        context.paint()
+        surface.flush()
+
+    def write_png(self, filename, scale = 1):
+        (width, height) = self.size(scale)
+        surface = cairo.ImageSurface(cairo.FORMAT_ARGB32, width, height)
+        self.replay(surface, scale)
+        surface.write_to_png(filename)
+
+    def write_svg(self, filename, scale = 1):
+        (width, height) = self.size(scale)
+        surface = cairo.SVGSurface(filename, width, height)
+        self.replay(surface, scale)
+        surface.finish()
+
+    def write_pdf(self, filename, scale = 1):
+        """ Write a single page pdf, one pixel of the canvas is a point on the page if scale is 1 """
+        (width, height) = self.size(scale)
+        surface = cairo.PDFSurface(filename, width, height)
+        self.replay(surface, scale)
+        surface.finish()
+
+if __name__ == "__main__":
+    argument_parser = argparse.ArgumentParser(description = "Run a command once and write the result at several sizes and as vector graphics")
+    argument_parser.add_argument('yaml_file')
+    argument_parser.add_argument('command')
+    argument_parser.add_argument('--seed', type = int, default = 0)
+    argument_parser.add_argument('--width', type = int, default = 640)
+    argument_parser.add_argument('--height', type = int, default = 480)
+    argument_parser.add_argument('--png', default = None, help = "write a png file for every scale, the pattern is formatted with the scale, e.g. 'house@%%sx.png'")
+    argument_parser.add_argument('--scales', type = float, nargs = '+', default = [1], help = "scales of the png files")
+    argument_parser.add_argument('--svg', default = None, help = "write an svg file")
+    argument_parser.add_argument('--pdf', default = None, help = "write a pdf file")
+    argument_parser.add_argument('--transparent', action = 'store_true', help = "record on a transparent instead of a white background")
+    argument_parser.add_argument('--parse-cache', default = None, help = "keep parsed definitions in this directory")
+    options = argument_parser.parse_args()
+
+    parser = GagParser.from_file(options.yaml_file, gui.Canvas(options.width, options.height), options.parse_cache)
+    recording = Recording.record(parser, options.command, options.transparent, options.seed)
+    if options.png:
+        for scale in options.scales:
+            filename = options.png % ('%g' % scale)
+            recording.write_png(filename, scale)
+            print filename
+    if options.svg:
+        recording.write_svg(options.svg)
+        print options.svg
+    if options.pdf:
+        recording.write_pdf(options.pdf)
+        print options.pdf
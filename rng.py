@@ -0,0 +1,59 @@
+# Random numbers for rand() arguments, in independent streams for every command instance
+
+import numpy
+
+MASK = 0xffffffffffffffff
+GOLDEN = 0x9e3779b97f4a7c15
+# Keys of sub-streams are derived differently from the values of a stream, so they never coincide
+CHILD_SALT = 0x5851f42d4c957f2d
+# Blocks with more values than this are drawn with numpy, which gives exactly the same values
+NUMPY_BLOCK = 32
+
+def mix(key, value):
+    """ splitmix64 of the value-th number after key """
+    z = (key + (value + 1) * GOLDEN) & MASK
+    z = ((z ^ (z >> 30)) * 0xbf58476d1ce4e5b9) & MASK
+    z = ((z ^ (z >> 27)) * 0x94d049bb133111eb) & MASK
+    return z ^ (z >> 31)
+
+def root_key(seed):
+    """ The key of a render with a seed """
+    return mix(seed & MASK, 0)
+
+def child_key(key, site):
+    """ The key of the stream of a sub-command, site tells apart all sub-commands started by the same command instance """
+    return mix(key ^ CHILD_SALT, site)
+
+def uniform_array(key, count):
+    """ The first count numbers of the stream of key as numpy array of floats in [0, 1) """
+    z = numpy.uint64(key) + numpy.arange(1, count + 1, dtype=numpy.uint64) * numpy.uint64(GOLDEN)
+    z = (z ^ (z >> numpy.uint64(30))) * numpy.uint64(0xbf58476d1ce4e5b9)
+    z = (z ^ (z >> numpy.uint64(27))) * numpy.uint64(0x94d049bb133111eb)
+    z = z ^ (z >> numpy.uint64(31))
+    return (z >> numpy.uint64(11)) * (1.0 / (1 << 53))
+
+def block(key, ranges):
+    """ Draw one value for every (from, to) range from the stream of key, like random.uniform would """
+    count = len(ranges)
+    if count > NUMPY_BLOCK:
+        ranges = numpy.array(ranges, dtype=numpy.float64)
+        return (ranges[:,0] + (ranges[:,1] - ranges[:,0]) * uniform_array(key, count)).tolist()
+    values = []
+    for (index, (low, high)) in enumerate(ranges):
+        z = (key + (index + 1) * GOLDEN) & MASK
+        z = ((z ^ (z >> 30)) * 0xbf58476d1ce4e5b9) & MASK
+        z = ((z ^ (z >> 27)) * 0x94d049bb133111eb) & MASK
+        z = z ^ (z >> 31)
+        values.append(low + (high - low) * ((z >> 11) * (1.0 / (1 << 53))))
+    return values
+
+class ArrayStream(object):
+    """ Hands out numpy arrays of random values from the stream of key, every request is a sub-stream of its own """
+    def __init__(self, key):
+        self.key = key
+        self.requests = 0
+
+    def uniform(self, low, high, count):
+        values = uniform_array(child_key(self.key, self.requests), count)
+        self.requests += 1
+        return low + (high - low) * values
@@ -0,0 +1,101 @@
+# Keeps parsed definitions on disk, so unchanged definitions don't have to be parsed again
+
+import hashlib
+import json
+import os
+import re
+import tempfile
+
+DEFINITION_START = re.compile(r'^-[ \t]*([\w.-]+)[ \t]*:', re.M)
+# Anchors and aliases may refer to other definitions, a single definition can't be parsed without them
+ANCHOR_OR_ALIAS = re.compile(r'(?:^|[\s\[{,])[&*][^\s\[\]{},]', re.M)
+
+def split_definitions(text):
+    """ Split the text of a yaml file into the texts of its top-level definitions, without parsing it.
+        Returns a list of (name, text) tuples, or None if the file isn't a plain block list of definitions
+        or uses anchors and aliases.
+    """
+    spans = definition_spans(text)
+    if spans is None: return None
+    return [(name, text[start:end]) for (name, start, end) in spans]
+
+def definition_spans(text):
+    """ Like split_definitions, but returns (name, start, end) tuples with the offsets of the definitions in text """
+    if ANCHOR_OR_ALIAS.search(text): return None
+    starts = list(DEFINITION_START.finditer(text))
+    if not starts: return None
+    # Apart from definitions, only comments and blank lines may start at the beginning of a line
+    for line in text.splitlines():
+        if line and not line[0].isspace() and line[0] != '#' and not DEFINITION_START.match(line):
+            return None
+    spans = []
+    for (index, start) in enumerate(starts):
+        end = starts[index + 1].start() if index + 1 < len(starts) else len(text)
+        spans.append( (start.group(1), start.start(), end) )
+    return spans
+
+def content_hash(text):
+    return hashlib.sha1(text).hexdigest()
+
+class ParseCache(object):
+    """ Caches parsed definitions as json, one file per source file in directory.
+        If a source file changed, only the definitions whose text changed are parsed again.
+        Entries are only used if they were created with the same data version.
+    """
+    def __init__(self, directory, version):
+        self.directory = directory
+        self.version = version
+        self.hits = 0
+        self.misses = 0
+
+    def cache_filename(self, filename):
+        return os.path.join(self.directory, '%s.json' % content_hash(os.path.abspath(filename)))
+
+    def read(self, cache_filename):
+        try:
+            cached = json.load(open(cache_filename, 'r'))
+        except (IOError, ValueError):
+            return None
+        if cached.get('version') != self.version: return None
+        return cached
+
+    def write(self, cache_filename, cached):
+        """ Write atomically, so concurrent readers never see half a file """
+        if not os.path.isdir(self.directory): os.makedirs(self.directory)
+        (handle, temporary_filename) = tempfile.mkstemp(dir = self.directory)
+        with os.fdopen(handle, 'w') as f:
+            json.dump(cached, f)
+        os.rename(temporary_filename, cache_filename)
+
+    def load(self, filename, parse_text):
+        """ Returns the parsed data of all definitions in a yaml file, in order.
+            parse_text is called with the text of changed definitions and has to return a list of json compatible data.
+        """
+        text = open(filename, 'r').read()
+        file_hash = content_hash(text)
+        cache_filename = self.cache_filename(filename)
+        cached = self.read(cache_filename)
+        if cached and cached['hash'] == file_hash:
+            self.hits += len(cached['definitions'])
+            return [item for (_, data) in cached['definitions'] for item in data]
+
+        known = {}
+        if cached:
+            for (definition_hash, data) in cached['definitions']:
+                known[definition_hash] = data
+
+        # Files that can't be split are cached as a whole
+        texts = [definition_text for (_, definition_text) in split_definitions(text) or [(None, text)]]
+        definitions = []
+        for definition_text in texts:
+            definition_hash = content_hash(definition_text)
+            if definition_hash in known:
+                self.hits += 1
+                data = known[definition_hash]
+            else:
+                self.misses += 1
+                data = parse_text(definition_text)
+            definitions.append( (definition_hash, data) )
+
+        self.write(cache_filename, {'version':self.version, 'hash':file_hash, 'definitions':definitions})
+        return [item for (_, data) in definitions for item in data]
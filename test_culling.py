@@ -0,0 +1,101 @@
+# Checks that culling never skips anything visible: python -m unittest test_culling
+
+import unittest
+import cairo
+import numpy
+import gui
+from parser import GagParser
+
+WIDTH = 100
+HEIGHT = 100
+
+# Every scene also draws something far outside of the canvas, so something is culled
+OFFSCREEN = """
+- offscreen:
+  - rect: [0, 0, 10, 10, 'c(0,1,0)']
+"""
+
+# B's width is set by A, which passes on its own variable y, which only C sets to something wide
+VARIABLE_WIDENING = OFFSCREEN + """
+- B:
+  - rect: [0, 0, 'x=10', 10, 'c(1,0,0)']
+- A:
+  - B:
+      args: [0, 0, 1]
+      kwargs:
+        vars: {x: 'y=0'}
+- C:
+  - offscreen: [5000, 5000, 1]
+  - A:
+      args: [-300, 10, 1]
+      kwargs:
+        vars: {y: 600}
+"""
+
+# The first few levels of R are above the canvas, only the self-call with the higher limit reaches into it
+DEEPEST_RECURSION = OFFSCREEN + """
+- R:
+  - rect: [0, 0, 10, 10, 'c(0,0,1)']
+  - R:
+      args: [20, 0, 1]
+      kwargs:
+        stop_recursion: {max_depth: 3}
+  - R:
+      args: [0, 20, 1]
+      kwargs:
+        stop_recursion: {max_depth: 30}
+- top:
+  - offscreen: [5000, 5000, 1]
+  - R: [10, -200, 1]
+"""
+
+# The pixel without a color is drawn with the color set by red, which is outside of the canvas
+COLOR_LEAK = OFFSCREEN + """
+- red:
+  - rect: [0, 0, 5, 5, 'c(1,0,0)']
+- blue:
+  - rect: [0, 0, 5, 5, 'c(0,0,1)']
+- leak:
+  - blue: [10, 10, 1]
+  - red: [5000, 5000, 1]
+  - pixel: [50, 50]
+  - offscreen: [5000, 5000, 1]
+"""
+
+class CullingTest(unittest.TestCase):
+    def render(self, text, command_name):
+        """ Returns the pixels of a command rendered with culling, and rendered onto another target without it """
+        canvas = gui.Canvas(WIDTH, HEIGHT)
+        parser = GagParser(text, canvas)
+        parser.parse()
+        canvas.fill(gui.Color())
+        parser.execute(command_name, 0)
+        canvas.flush()
+        self.assertTrue(parser.executor.culled_offscreen > 0)
+        culled = canvas.data.view(numpy.uint8).copy()
+
+        # There is no viewport while drawing onto another target, so nothing is culled
+        surface = cairo.ImageSurface(cairo.FORMAT_ARGB32, WIDTH, HEIGHT)
+        canvas.push_target(surface)
+        canvas.fill(gui.Color())
+        parser.execute(command_name, 0)
+        canvas.pop_target()
+        surface.flush()
+        unculled = numpy.frombuffer(surface.get_data(), dtype=numpy.uint8)
+        return (culled, unculled)
+
+    def assert_same(self, text, command_name):
+        (culled, unculled) = self.render(text, command_name)
+        self.assertTrue(numpy.array_equal(culled, unculled), "%s looks different when culled" % command_name)
+
+    def test_variable_widening(self):
+        self.assert_same(VARIABLE_WIDENING, 'C')
+
+    def test_deepest_recursion(self):
+        self.assert_same(DEEPEST_RECURSION, 'top')
+
+    def test_color_leak(self):
+        self.assert_same(COLOR_LEAK, 'leak')
+
+if __name__ == "__main__":
+    unittest.main()
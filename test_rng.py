@@ -0,0 +1,49 @@
+# Checks that random numbers don't depend on how they are drawn: python -m unittest test_rng
+
+import os
+import unittest
+import numpy
+import gui
+import rng
+import tiles
+from parser import GagParser
+
+YAML_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'test.yaml')
+
+class BlockTest(unittest.TestCase):
+    def test_numpy_block_matches_loop(self):
+        """ Blocks with more than NUMPY_BLOCK values are drawn with numpy, they must be exactly the same as drawn one by one """
+        ranges = [(index * 0.5, index * 2.0 + 1) for index in range(rng.NUMPY_BLOCK + 1)]
+        key = rng.root_key(123)
+        values = rng.block(key, ranges)
+        numpy_block = rng.NUMPY_BLOCK
+        rng.NUMPY_BLOCK = len(ranges)
+        try:
+            loop_values = rng.block(key, ranges)
+        finally:
+            rng.NUMPY_BLOCK = numpy_block
+        self.assertEqual(values, loop_values)
+
+class TilesTest(unittest.TestCase):
+    def test_tiles_match_single_render(self):
+        """ A picture rendered in tiles is the same as rendered in one piece with the same seed """
+        (command_name, seed, width, height, tile_size) = ('village', 7, 640, 480, 256)
+        canvas = gui.Canvas(width, height)
+        parser = GagParser.from_file(YAML_FILE, canvas)
+        canvas.fill(gui.Color())
+        parser.execute(command_name, seed)
+        canvas.flush()
+        expected = canvas.data.view(numpy.uint8).reshape( (height, width * 4) )
+
+        tiles.init_worker(YAML_FILE, tile_size, None, None)
+        for y in range(0, height, tile_size):
+            for x in range(0, width, tile_size):
+                (tile_width, tile_height) = (min(tile_size, width - x), min(tile_size, height - y))
+                (_, _, tile) = tiles.render_tile( (command_name, seed, x, y, tile_width, tile_height, 1, False) )
+                part = expected[y:y + tile_height, x * 4:(x + tile_width) * 4].astype(int)
+                # Shapes are filled in other batches when others are culled, which may change antialiased edges slightly
+                difference = numpy.abs(tile.view(numpy.uint8).astype(int) - part).max()
+                self.assertTrue(difference <= 2, "Tile at %s, %s differs by %s" % (x, y, difference))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,82 @@
+# Renders a single large picture in tiles, using a pool of worker processes
+
+import argparse
+import multiprocessing
+import os
+import cairo
+import numpy
+import gui
+import writer
+from parser import GagParser
+
+# Every worker process parses the definitions once and renders all of its tiles onto the same canvas
+worker_parser = None
+
+def init_worker(yaml_file, tile_size, cache_bytes, parse_cache):
+    global worker_parser
+    worker_parser = GagParser.from_file(yaml_file, gui.Canvas(tile_size, tile_size), parse_cache)
+    if cache_bytes: worker_parser.enable_cache(cache_bytes)
+
+def render_tile(job):
+    """ Render the part of the picture at x, y with a size of width, height. Returns (x, y, pixel data). """
+    (command_name, seed, x, y, width, height, scale, transparent) = job
+    canvas = worker_parser.gui
+    if transparent:
+        canvas.clear()
+    else:
+        canvas.fill(gui.Color())
+    # Move the tile's part of the picture onto the canvas
+    canvas.set_matrix(cairo.Matrix(scale, 0, 0, scale, -x, -y))
+    worker_parser.execute(command_name, seed)
+    canvas.flush()
+    data = canvas.data.reshape( (canvas.height, canvas.width * 4) )[:height,:width * 4]
+    return (x, y, data.copy())
+
+def render_tiled(yaml_file, command_name, filename, width, height, scale = 1, seed = 0, tile_size = 512, processes = None, transparent = False, cache_bytes = None, parse_cache = None):
+    """ Render a command into a png file of width x height pixels, scaled by scale, in tiles of tile_size x tile_size pixels.
+        All tiles are rendered with the same seed, so the picture is the same as if it was rendered in one piece.
+        Every sub-command draws its random numbers from a stream of its own, so skipping the ones outside of a tile doesn't change the others.
+    """
+    jobs = []
+    for y in range(0, height, tile_size):
+        for x in range(0, width, tile_size):
+            jobs.append( (command_name, seed, x, y, min(tile_size, width - x), min(tile_size, height - y), scale, transparent) )
+
+    if not processes: processes = multiprocessing.cpu_count()
+    # Update the parse cache once, so all workers find it complete, libraries are parsed on demand and not cached
+    if parse_cache and not os.path.isdir(yaml_file): GagParser(None, None).load(yaml_file, parse_cache)
+    data = numpy.empty( (height, width * 4), dtype=numpy.int8)
+    pool = multiprocessing.Pool(processes, init_worker, (yaml_file, tile_size, cache_bytes, parse_cache))
+    try:
+        for (x, y, tile) in pool.imap_unordered(render_tile, jobs):
+            (tile_height, tile_width) = tile.shape
+            data[y:y + tile_height, x * 4:x * 4 + tile_width] = tile
+        pool.close()
+    except:
+        pool.terminate()
+        raise
+    finally:
+        pool.join()
+    writer.encode_png(filename, width, height, data)
+    return filename
+
+if __name__ == "__main__":
+    argument_parser = argparse.ArgumentParser(description = "Render a command into a large png file, in tiles on all cores")
+    argument_parser.add_argument('yaml_file')
+    argument_parser.add_argument('command')
+    argument_parser.add_argument('filename')
+    argument_parser.add_argument('--width', type = int, default = 640)
+    argument_parser.add_argument('--height', type = int, default = 480)
+    argument_parser.add_argument('--scale', type = float, default = 1, help = "scale the picture, e.g. 4 to render a 640x480 scene at 2560x1920")
+    argument_parser.add_argument('--seed', type = int, default = 0)
+    argument_parser.add_argument('--tile-size', type = int, default = 512)
+    argument_parser.add_argument('--processes', type = int, default = None, help = "number of worker processes, defaults to the number of cores")
+    argument_parser.add_argument('--transparent', action = 'store_true', help = "render on a transparent instead of a white background")
+    argument_parser.add_argument('--cache', type = int, default = None, help = "cache rasterized deterministic commands, up to this many megabytes per worker")
+    argument_parser.add_argument('--parse-cache', default = None, help = "keep parsed definitions in this directory")
+    options = argument_parser.parse_args()
+
+    render_tiled(options.yaml_file, options.command, options.filename, options.width, options.height, options.scale,
+        options.seed, options.tile_size, options.processes, options.transparent,
+        options.cache and options.cache * 1024 * 1024, options.parse_cache)
+    print options.filename
@@ -0,0 +1,128 @@
+# Writes rendered frames in the background, so rendering the next frame doesn't wait for encoding
+
+import collections
+import multiprocessing
+import os
+import subprocess
+import threading
+import Queue
+import cairo
+
+def encode_png(filename, width, height, data):
+    """ Encode a snapshot of a canvas into a png file, runs in a worker process """
+    surface = cairo.ImageSurface.create_for_data(data, cairo.FORMAT_ARGB32, width, height, width * 4)
+    surface.write_to_png(filename)
+    return filename
+
+class FrameWriter(object):
+    """ Base class for frame writers. Frames are snapshots of a canvas, write() blocks once queue_size frames are waiting. """
+    def __init__(self, queue_size = 8):
+        self.queue_size = queue_size
+        self.frame_count = 0
+
+    def write(self, canvas):
+        """ Take a snapshot of the canvas and queue it for encoding """
+        canvas.flush()
+        self.write_frame(self.frame_count, canvas.width, canvas.height, canvas.data.copy())
+        self.frame_count += 1
+
+    def write_frame(self, index, width, height, data):
+        raise NotImplementedError()
+
+    def close(self):
+        """ Wait until all queued frames are written """
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exception_type, exception, traceback):
+        self.close()
+
+class PngSequenceWriter(FrameWriter):
+    """ Writes every frame into its own png file, encoding frames in parallel in a pool of processes.
+        pattern is formatted with the frame index, e.g. 'frame-%03d.png'
+    """
+    def __init__(self, pattern = 'frame-%03d.png', processes = None, queue_size = None):
+        if not processes: processes = multiprocessing.cpu_count()
+        FrameWriter.__init__(self, queue_size or processes * 2)
+        self.pattern = pattern
+        self.pool = multiprocessing.Pool(processes)
+        self.pending = collections.deque()
+
+    def write_frame(self, index, width, height, data):
+        # Backpressure: wait for the oldest frame once too many are being encoded
+        while len(self.pending) >= self.queue_size:
+            self.pending.popleft().get()
+        self.pending.append( self.pool.apply_async(encode_png, (self.pattern % index, width, height, data)) )
+
+    def close(self):
+        try:
+            while self.pending:
+                self.pending.popleft().get()
+            self.pool.close()
+        except:
+            self.pool.terminate()
+            raise
+        finally:
+            self.pool.join()
+
+class PipeWriter(FrameWriter):
+    """ Pipes raw frames into the standard input of an encoder process, from a background thread.
+        Frames are cairo's native ARGB32 pixels, which is 'bgra' in ffmpeg terms on little-endian machines.
+        command is the argument list of the encoder, or a function returning it for the (width, height) of the first frame.
+    """
+    def __init__(self, command, queue_size = 8):
+        FrameWriter.__init__(self, queue_size)
+        self.command = command
+        self.process = None
+        self.error = None
+        self.queue = Queue.Queue(queue_size)
+        self.thread = threading.Thread(target = self._write_frames)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def write_frame(self, index, width, height, data):
+        if self.error: raise self.error
+        self.queue.put( (width, height, data) )
+
+    def _write_frames(self):
+        while True:
+            frame = self.queue.get()
+            if frame is None: break
+            # After an error, keep draining the queue so write() never blocks forever
+            if self.error: continue
+            (width, height, data) = frame
+            try:
+                if self.process is None:
+                    command = self.command
+                    if callable(command): command = command(width, height)
+                    self.process = subprocess.Popen(command, stdin = subprocess.PIPE)
+                self.process.stdin.write(data.data)
+            except Exception, e:
+                self.error = e
+
+    def close(self):
+        self.queue.put(None)
+        self.thread.join()
+        if self.process:
+            self.process.stdin.close()
+            if self.process.wait() and not self.error:
+                self.error = Exception("Encoder %s exited with %s" % (self.process.pid, self.process.returncode))
+        if self.error: raise self.error
+
+class AnimationWriter(PipeWriter):
+    """ Writes all frames into a single animated file like an mp4, webm or gif using ffmpeg, which encodes on multiple cores """
+    def __init__(self, filename, fps = 50, encoder = 'ffmpeg', queue_size = 8):
+        self.filename = filename
+        self.fps = fps
+        self.encoder = encoder
+        PipeWriter.__init__(self, self.encoder_command, queue_size)
+
+    def encoder_command(self, width, height):
+        command = [self.encoder, '-y', '-loglevel', 'error', '-f', 'rawvideo', '-pix_fmt', 'bgra',
+            '-s', '%sx%s' % (width, height), '-r', str(self.fps), '-i', '-']
+        # Most players only support h264 with chroma subsampling
+        if os.path.splitext(self.filename)[1].lower() in ('.mp4', '.mov'):
+            command += ['-pix_fmt', 'yuv420p']
+        return command + [self.filename]